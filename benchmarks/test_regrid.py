@@ -206,3 +206,34 @@ class TestRegrid(unittest.TestCase):
         )
         del result
         gc.collect()
+
+    @pytest.mark.benchmark(group="adapters-regrid-threads")
+    def test_regrid_threads_01_2048x1024_1(self):
+        self.run_threads(1)
+
+    @pytest.mark.benchmark(group="adapters-regrid-threads")
+    def test_regrid_threads_02_2048x1024_2(self):
+        self.run_threads(2)
+
+    @pytest.mark.benchmark(group="adapters-regrid-threads")
+    def test_regrid_threads_03_2048x1024_4(self):
+        self.run_threads(4)
+
+    @pytest.mark.benchmark(group="adapters-regrid-threads")
+    def test_regrid_threads_04_2048x1024_8(self):
+        self.run_threads(8)
+
+    def run_threads(self, threads):
+        grid1 = fm.UniformGrid((2048, 1024))
+        grid2 = fm.UniformGrid((2048, 1024), origin=(0.25, 0.25))
+
+        self.setup_adapter(
+            grid1,
+            grid2,
+            fmr.Regrid(regrid_method=fmr.RegridMethod.BILINEAR, threads=threads),
+        )
+        result = self.benchmark(
+            self.adapter.get_data, time=dt.datetime(2000, 1, 1), target=None
+        )
+        del result
+        gc.collect()
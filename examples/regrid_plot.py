@@ -3,7 +3,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from finam_plot import ContourPlot, GridSpecPlot, ImagePlot
 
-from finam_regrid import ExtrapMethod, Regrid, RegridMethod
+from finam_regrid import ExtrapMethod, RegridFanOut, RegridMethod
 
 if __name__ == "__main__":
     in_grid = fm.UniformGrid((21, 17))
@@ -32,22 +32,24 @@ if __name__ == "__main__":
         ["Unif", "Unif2", "Orig", "Points"], title="Grid specifications"
     )
 
-    regrid_unif = Regrid(
+    fan_out = RegridFanOut()
+    regrid_unif = fan_out.add_regrid(
         out_grid=uniform_grid, extrap_method=ExtrapMethod.NEAREST_IDAVG
     )
-    regrid_unif_2 = Regrid(
+    regrid_unif_2 = fan_out.add_regrid(
         regrid_method=RegridMethod.CONSERVE_2ND, out_grid=uniform_grid_2
     )
-    regrid_points = Regrid(out_grid=unstructured_grid)
+    regrid_points = fan_out.add_regrid(out_grid=unstructured_grid)
 
     comp = fm.Composition(
         [source, plot_orig, plot_unif, plot_unif_2, plot_points, specs]
     )
 
     source.outputs["Noise"] >> plot_orig.inputs["Grid"]
-    (source.outputs["Noise"] >> regrid_unif >> plot_unif.inputs["Grid"])
-    (source.outputs["Noise"] >> regrid_unif_2 >> plot_unif_2.inputs["Grid"])
-    (source.outputs["Noise"] >> regrid_points >> plot_points.inputs["Grid"])
+    source.outputs["Noise"] >> fan_out
+    regrid_unif >> plot_unif.inputs["Grid"]
+    regrid_unif_2 >> plot_unif_2.inputs["Grid"]
+    regrid_points >> plot_points.inputs["Grid"]
 
     source["Noise"] >> specs["Orig"]
     regrid_unif >> specs["Unif"]
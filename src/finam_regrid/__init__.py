@@ -15,6 +15,7 @@ Adapter
    :caption: Adapter
 
     Regrid
+    RegridFanOut
 
 Constants
 =========
@@ -28,17 +29,36 @@ Constants
     Region
     RegridMethod
     UnmappedAction
-"""
 
-from esmpy.api.constants import (
-    ExtrapMethod,
-    NormType,
-    Region,
-    RegridMethod,
-    UnmappedAction,
-)
+ESMF is imported and initialized on first use by a regridding adapter,
+or when accessing one of the constants.
+
+Configuration
+=============
+
+.. autosummary::
+   :toctree: generated
+   :caption: Configuration
+
+    configure_esmf
+
+Tools
+=====
+
+.. autosummary::
+   :toctree: generated
+   :caption: Tools
+
+    tools.grid_fingerprint
+    weights.apply_weights_lazy
+
+:meth:`Regrid.regrid_stack` regrids stacks of time steps with the weights
+of a connected adapter, lazily for dask arrays.
+"""
 
 from .adapter import Regrid
+from .fan_out import RegridFanOut
+from .tools import configure_esmf
 
 try:
     from ._version import __version__
@@ -47,5 +67,26 @@ except ModuleNotFoundError:  # pragma: no cover
     __version__ = "0.0.0.dev0"
 
 
-__all__ = ["Regrid"]
-__all__ += ["ExtrapMethod", "RegridMethod", "UnmappedAction", "NormType", "Region"]
+_ESMPY_CONSTANTS = [
+    "ExtrapMethod",
+    "RegridMethod",
+    "UnmappedAction",
+    "NormType",
+    "Region",
+]
+
+__all__ = ["Regrid", "RegridFanOut"]
+__all__ += _ESMPY_CONSTANTS
+__all__ += ["configure_esmf"]
+
+
+def __getattr__(name):
+    if name in _ESMPY_CONSTANTS:
+        from esmpy.api import constants
+
+        return getattr(constants, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + _ESMPY_CONSTANTS)
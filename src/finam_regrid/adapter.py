@@ -1,11 +1,43 @@
 """ESMF regridding adapters."""
 
-import esmpy
+import collections.abc
+import dataclasses
+import enum
+import json
+from typing import Any, Optional
+
 import finam as fm
 import numpy as np
+from finam.errors import FinamMetaDataError
 from finam.tools.log_helper import ErrorLogger
 
-from .tools import create_transformer, to_esmf
+from .grids import (
+    canonical_shape,
+    changed_cells,
+    grid_fingerprint,
+    horizontal_grid,
+    same_topology,
+)
+from .tools import (
+    cell_areas,
+    get_esmpy,
+    is_spherical,
+    output_transformer,
+    regrid_weights,
+    set_esmf_mask,
+    to_esmf,
+    update_esmf_coords,
+)
+from .weights import (
+    RegridWeights,
+    prune_weights,
+    replace_rows,
+    transpose_weights,
+    unmapped_cells,
+    vertical_weights,
+)
+
+_STATE_VERSION = 1
 
 
 class Regrid(fm.adapters.regrid.ARegridding):
@@ -49,6 +81,23 @@ class Regrid(fm.adapters.regrid.ARegridding):
             extrap_method=fmr.ExtrapMethod.NEAREST_IDAVG,
         )
 
+    Getting an adapter for the reverse direction, e.g. for two-way coupling:
+
+    .. testcode:: constructor
+
+        adapter = fmr.Regrid(
+            regrid_method=fmr.RegridMethod.CONSERVE,
+        )
+        reverse_adapter = adapter.reverse()
+
+    Saving the state of an initialized adapter, and restoring it for a restart:
+
+    .. code-block:: Python
+
+        adapter.save_state("regrid.npz")
+
+        adapter = fmr.Regrid.load_state("regrid.npz")
+
     Parameters
     ----------
 
@@ -59,6 +108,42 @@ class Regrid(fm.adapters.regrid.ARegridding):
     zero_region : Region or None, optional
         specify which region of the field indices will be zeroed out before
         adding the values resulting from the interpolation. If None, defaults to Region.TOTAL.
+    separable : bool, optional
+        Separate horizontal and vertical regridding for layered 3D structured grids. Default ``False``.
+        Horizontal weights are calculated by ESMF for the 2D grids.
+        Vertical weights are calculated for the third axis, with conservative remapping for
+        conservative regridding methods, nearest neighbour for nearest neighbour methods
+        and linear interpolation otherwise.
+        All layers are regridded in one vectorized operation.
+    out_units : str or pint.Unit, optional
+        Units of the output. The conversion from the input units is done during regridding,
+        so that the input units are not converted upstream. Keeps the input units if not specified.
+    scale : float, optional
+        Factor applied to the regridded data, after unit conversion. Default ``1.0``.
+    offset : float, optional
+        Offset added to the regridded data, after scaling. Default ``0.0``.
+    prune_threshold : float, optional
+        Drop weights below this fraction of the largest weight of their output cell.
+        The remaining weights are renormalized, to preserve conservation for conservative methods
+        and the sum of weights per output cell otherwise.
+        The reduction of weights and the maximum introduced error are logged and stored in :attr:`.prune_info`.
+    prune_max_entries : int, optional
+        Maximum number of weights per output cell. Renormalized like with ``prune_threshold``.
+    crop_source : bool, optional
+        Restrict regridding to the window of source cells that contribute to the output. Default ``False``.
+        Useful if the target covers only a small part of the source grid.
+        Weights are applied as sparse matrix to the source window only,
+        so that the data traffic per time step scales with the target footprint.
+    threads : int, optional
+        Number of threads for applying the weights. Default ``None`` (regridding by ESMF).
+        If given, weights are applied as sparse matrix, with the output cells
+        partitioned across a thread pool.
+    diagnostics : bool, optional
+        Calculate the global conservation error in each time step. Default ``False``.
+        Cell areas and the area-weighted column sums of the weights are calculated once,
+        so that the source and target integrals only cost one extra product with the source data.
+        Results are logged at debug level and stored in :attr:`.conservation`.
+        Requires data on cells, and is not available for separable regridding.
     **regrid_args : Any
         Keyword argument passed to the ESMPy class
         `Regrid <https://earthsystemmodeling.org/esmpy_doc/release/latest/html/regrid.html>`_.
@@ -73,9 +158,36 @@ class Regrid(fm.adapters.regrid.ARegridding):
         Action on unmapped cells. See :class:`.UnmappedAction`. Defaults to :attr:`.UnmappedAction.IGNORE`.
     """
 
-    def __init__(self, in_grid=None, out_grid=None, zero_region=None, **regrid_args):
+    def __init__(
+        self,
+        in_grid=None,
+        out_grid=None,
+        zero_region=None,
+        *,
+        separable=False,
+        out_units=None,
+        scale=1.0,
+        offset=0.0,
+        prune_threshold=None,
+        prune_max_entries=None,
+        crop_source=False,
+        threads=None,
+        diagnostics=False,
+        **regrid_args,
+    ):
         super().__init__(in_grid, out_grid)
         self.regrid_args = regrid_args
+        self.options = RegridOptions(
+            separable=separable,
+            out_units=out_units,
+            scale=scale,
+            offset=offset,
+            prune_threshold=prune_threshold,
+            prune_max_entries=prune_max_entries,
+            crop_source=crop_source,
+            threads=threads,
+            diagnostics=diagnostics,
+        )
         self.regrid = None
         self.in_grid = None
         self.out_grid = None
@@ -83,45 +195,751 @@ class Regrid(fm.adapters.regrid.ARegridding):
         self.out_field = None
         self.zero_region = zero_region
         self.output_mask = fm.Mask.FLEX
+        self.weights = None
+        self._keep_weights = self.options.sparse or diagnostics
+        self._forward = None
+        self._conversion = (1.0, 0.0)
+
+    @property
+    def prune_info(self):
+        """dict or None: Entry counts and maximum introduced error of the weight pruning."""
+        return None if self.weights is None else self.weights.prune_info
+
+    @property
+    def conservation(self):
+        """dict or None: Result of the conservation diagnostics of the last time step."""
+        return None if self.weights is None else self.weights.conservation
+
+    def reverse(self, zero_region=None, **options):
+        """Creates a regridding adapter for the reverse direction.
+
+        For first order conservative regridding (:attr:`.RegridMethod.CONSERVE`)
+        without extrapolation and with destination area normalization,
+        the reverse weights are derived from the transposed weights of this adapter and the cell areas,
+        without another ESMF weight calculation.
+        The reverse adapter applies the transpose as area-weighted weights, sharing the weights of this adapter.
+        If its weights are pruned, cropped or applied with multiple threads, it derives its own matrix.
+        This adapter keeps its weights and applies them as sparse matrix.
+        If it is already initialized and regrids using ESMF directly,
+        its weights are calculated once more to extract them.
+
+        For other methods, or if this adapter is not yet initialized when the reverse adapter needs its weights,
+        the reverse adapter calculates its own weights.
+
+        Parameters
+        ----------
+        zero_region : Region or None, optional
+            specify which region of the field indices will be zeroed out before
+            adding the values resulting from the interpolation. If None, defaults to Region.TOTAL.
+        **options : Any
+            Options of the reverse adapter, like ``threads`` or ``crop_source``. See :class:`.Regrid`.
+            Only the arguments for ESMPy are taken from this adapter, its options are not carried over.
+
+        Returns
+        -------
+        Regrid
+            The regridding adapter for the reverse direction.
+        """
+        unknown = set(options) - {f.name for f in dataclasses.fields(RegridOptions)}
+        if unknown:
+            raise TypeError(f"Regrid.reverse: unknown options {sorted(unknown)}")
+
+        reverse = Regrid(
+            in_grid=self.output_grid,
+            out_grid=self.input_grid,
+            zero_region=zero_region,
+            **options,
+            **self.regrid_args,
+        )
+        reverse._forward = self  # pylint: disable=protected-access
+        self._keep_weights = self._keep_weights or _is_transposable(self.regrid_args)
+        return reverse
+
+    def update_grids(self, in_grid=None, out_grid=None):
+        """Updates the grid specifications of an initialized adapter, e.g. for moving grids.
+
+        If only coordinates change, but not the grid topology,
+        the ESMF grids and location streams are updated in place.
+        If only the coordinates of some output cells change,
+        only the weights for these cells are recalculated.
+
+        The first update calculates all weights, as they need to be stored for later partial updates.
+        Partial updates are not possible for meshes, for extrapolation, for destination masks
+        and for nearest neighbour methods, as their weights of a cell depend on other cells.
+
+        If the output grid changes, the output info of the adapter is updated with the new grid.
+
+        Parameters
+        ----------
+        in_grid : finam.Grid, optional
+            New input grid specification. Keeps the current one if not specified.
+        out_grid : finam.Grid, optional
+            New output grid specification. Keeps the current one if not specified.
+        """
+        with ErrorLogger(self.logger):
+            if not self._is_initialized:
+                raise FinamMetaDataError("Can't update grids before initialization")
+
+        self.input_grid = in_grid or self.input_grid
+        self.output_grid = out_grid or self.output_grid
+        self._update_grid_specs()
+        if out_grid is not None:
+            self.push_info(self.info.copy_with(grid=self.output_grid))
+
+    def save_state(self, file):
+        """Saves the state of the initialized adapter, for restoring it with :meth:`.load_state`.
+
+        The state contains the options, fingerprints of the grids and the weights as sparse matrix.
+        If the adapter regrids using ESMF directly, the weights are calculated once more to extract them.
+
+        Parameters
+        ----------
+        file : str or pathlib.Path or file-like
+            File to save the state to, in NumPy ``.npz`` format.
+        """
+        self._require_weights("save state")
+
+        np.savez_compressed(
+            file,
+            version=_STATE_VERSION,
+            options=json.dumps(self._options()),
+            **self.weights.to_state(),
+        )
+
+    @classmethod
+    def load_state(cls, file):
+        """Creates an adapter from a state saved with :meth:`.save_state`.
+
+        The adapter uses the stored options and weights, without calculating weights with ESMF.
+        During initialization, it is checked that the grids match the stored grids.
+
+        Parameters
+        ----------
+        file : str or pathlib.Path or file-like
+            File to load the state from.
+
+        Returns
+        -------
+        Regrid
+            The restored adapter.
+        """
+        with np.load(file) as state:
+            if int(state["version"]) != _STATE_VERSION:
+                raise ValueError(f"Unsupported state version {int(state['version'])}")
+            options = json.loads(str(state["options"]))
+            weights = RegridWeights.from_state(state)
+
+        regrid_args = {
+            key: _decode_option(value)
+            for key, value in options.pop("regrid_args").items()
+        }
+        zero_region = _decode_option(options.pop("zero_region"))
+        adapter = cls(zero_region=zero_region, **options, **regrid_args)
+        adapter.weights = weights
+        return adapter
+
+    def regrid_stack(self, data):
+        """Regrids a stack of time steps at once, using the weights of the initialized adapter.
+
+        Useful for offline regridding of long time series, without the overhead of a composition.
+        All time steps of a block are regridded in one application of the weights.
+        If the adapter regrids using ESMF directly, the weights are calculated once more to extract them.
+
+        Data is converted by ``out_units``, ``scale`` and ``offset`` like in regular regridding.
+
+        Stacks given as `dask <https://www.dask.org>`_ arrays are regridded lazily, chunk by chunk,
+        without loading them into memory (see :func:`.weights.apply_weights_lazy`).
+        This requires the optional dependency ``dask``.
+
+        Parameters
+        ----------
+        data : array_like or iterator of array_like
+            Either a single stack of shape ``(n_times, *in_grid.data_shape)``, with a leading time axis.
+            This can be an array, a dask array, a :class:`pint.Quantity` (converted to the units of the source),
+            or any other array_like such as a list of time steps.
+            Or an iterator (e.g. a generator or ``iter(blocks)``) of such stacks, regridded block by block.
+
+        Returns
+        -------
+        numpy.ndarray or dask.array.Array or generator
+            Regridded data of shape ``(n_times, *out_grid.data_shape)``, without units.
+            A lazy dask array for a dask input,
+            or a generator of regridded stacks for an iterator input.
+        """
+        self._require_weights("regrid")
+        if isinstance(data, collections.abc.Iterator):
+            return (self._regrid_block(block) for block in data)
+        return self._regrid_block(data)
+
+    def _regrid_block(self, block):
+        if fm.data.is_quantified(block):
+            if self.in_info is not None and self.in_info.units is not None:
+                block = block.to(self.in_info.units)
+            block = block.magnitude
+        if _is_dask_array(block):
+            return self._regrid_lazy(block)
+        block = np.asanyarray(block)
+
+        with ErrorLogger(self.logger):
+            if fm.data.has_masked_values(block):
+                msg = "Regridding is currently not implemented for masked data"
+                raise NotImplementedError(msg)
+
+        block = np.stack([self.input_grid.to_canonical(step) for step in block])
+        scale, offset = self._scaling()
+        result = self.weights.apply_stack(block, scale=scale, offset=offset)
+        return np.stack([self.output_grid.from_canonical(step) for step in result])
+
+    def _regrid_lazy(self, block):
+        import dask.array as da
+
+        scale, offset = self._scaling()
+        return da.stack(
+            [
+                self.output_grid.from_canonical(
+                    self.weights.apply_lazy(
+                        self.input_grid.to_canonical(step), scale=scale, offset=offset
+                    )
+                )
+                for step in block
+            ]
+        )
+
+    def _require_weights(self, action):
+        with ErrorLogger(self.logger):
+            if not self._is_initialized:
+                raise FinamMetaDataError(f"Can't {action} before initialization")
+
+        if self._forward is not None:
+            self._create_reverse()
+        if self.weights.matrix is None:
+            self._keep_weights = True
+            self._compute_regrid()
+
+    def _options(self):
+        options = dataclasses.asdict(self.options)
+        if options["out_units"] is not None:
+            options["out_units"] = str(options["out_units"])
+        return {
+            "zero_region": _encode_option(self.zero_region),
+            **options,
+            "regrid_args": {
+                key: _encode_option(value) for key, value in self.regrid_args.items()
+            },
+        }
+
+    def _scaling(self):
+        # unit conversion, followed by scale and offset
+        factor, offset = self._conversion
+        return (
+            self.options.scale * factor,
+            self.options.scale * offset + self.options.offset,
+        )
+
+    def _restore(self):
+        fingerprints = (
+            grid_fingerprint(self.input_grid),
+            grid_fingerprint(self.output_grid),
+        )
+        with ErrorLogger(self.logger):
+            if self.weights.fingerprints != fingerprints:
+                raise FinamMetaDataError("Grids don't match the restored state")
+
+        self.weights.fingerprints = None
+        self.weights.grids = (self.input_grid, self.output_grid)
+        self._crop()
+        self.weights.split(self.options.threads)
+
+    def _get_info(self, info):
+        out_units = self.options.out_units
+        if out_units is None:
+            return super()._get_info(info)
+
+        # request source units, as conversion is done during regridding
+        out_info = super()._get_info(info.copy_with(units=None))
+        with ErrorLogger(self.logger):
+            if not fm.data.tools.compatible_units(out_info.units, out_units):
+                msg = f"Can't convert from {out_info.units} to {out_units}"
+                raise FinamMetaDataError(msg)
+
+        zero = fm.UNITS.Quantity(0.0, out_info.units).to(out_units)
+        one = fm.UNITS.Quantity(1.0, out_info.units).to(out_units)
+        self._conversion = (one.magnitude - zero.magnitude, zero.magnitude)
+        return out_info.copy_with(units=out_units)
+
+    def _update_grid_specs(self):
+        if self._forward is not None:
+            # reverse weights are derived on first data request
+            return
+        if self.weights is not None and self.weights.grids is None:
+            # weights restored from a state
+            self._restore()
+        elif self.options.separable:
+            self._create_separable()
+        elif self.in_field is None:
+            self.in_grid, self.in_field = self._source_field()
+            self._create_regrid()
+        else:
+            self._update_regrid()
+
+    def _source_field(self):
+        return to_esmf(self.input_grid, spherical=is_spherical(self.input_grid))
+
+    def _reverse_weights(self, in_grid, out_grid):
+        if (
+            not self._is_initialized
+            or not _is_transposable(self.regrid_args)
+            or self.options.separable
+            or not _same_grid(in_grid, self.output_grid)
+            or not _same_grid(out_grid, self.input_grid)
+        ):
+            return None
+
+        self._require_weights("derive reverse weights")
+        if self.in_field is None or self.out_field is None:
+            # no ESMF fields for cell areas, e.g. for a restored adapter
+            return None
+        return (
+            self.weights.matrix,
+            cell_areas(self.in_field),
+            cell_areas(self.out_field),
+        )
+
+    def _create_reverse(self):
+        # pylint: disable-next=protected-access
+        forward = self._forward._reverse_weights(self.input_grid, self.output_grid)
+        self._forward = None
+        if forward is None:
+            self.logger.debug("can't derive reverse weights, calculating weights")
+            self.in_grid, self.in_field = self._source_field()
+            self._create_regrid()
+            return
+
+        matrix, src_areas, dst_areas = forward
+        areas = None
+        if self.options.sparse:
+            # processed weights need their own matrix
+            matrix = transpose_weights(matrix, src_areas, dst_areas)
+        else:
+            # transposed view, sharing the buffers of the forward weights
+            matrix, areas = matrix.T, (dst_areas, src_areas)
+        self._set_weights(matrix, unmapped_cells(matrix, self.zero_region), areas=areas)
+
+    def _create_regrid(self):
+        esmpy = get_esmpy()
         if "unmapped_action" not in self.regrid_args:
             self.regrid_args["unmapped_action"] = esmpy.UnmappedAction.IGNORE
 
-    def _update_grid_specs(self):
-        transformer = create_transformer(self.input_grid.crs, self.output_grid.crs)
-        self.in_grid, self.in_field = to_esmf(self.input_grid)
-        self.out_grid, self.out_field = to_esmf(self.output_grid, transformer)
+        transformer = output_transformer(self.input_grid, self.output_grid)
+        self.out_grid, self.out_field = to_esmf(
+            self.output_grid, transformer, is_spherical(self.input_grid)
+        )
+        self._compute_regrid()
+
+    def _create_separable(self):
+        with ErrorLogger(self.logger):
+            for grid in [self.input_grid, self.output_grid]:
+                if not isinstance(grid, fm.data.StructuredGrid) or grid.dim != 3:
+                    msg = "Separable regridding requires 3D structured grids"
+                    raise FinamMetaDataError(msg)
+
+        self._destroy_esmf()
+
+        esmpy = get_esmpy()
+        if "unmapped_action" not in self.regrid_args:
+            self.regrid_args["unmapped_action"] = esmpy.UnmappedAction.IGNORE
+
+        in_grid = horizontal_grid(self.input_grid)
+        spherical = is_spherical(in_grid)
+        transformer = output_transformer(in_grid, self.output_grid)
+        self.in_grid, self.in_field = to_esmf(in_grid, spherical=spherical)
+        self.out_grid, self.out_field = to_esmf(
+            horizontal_grid(self.output_grid), transformer, spherical
+        )
+        regrid = esmpy.Regrid(
+            self.in_field, self.out_field, factors=True, **self.regrid_args
+        )
+        matrix = regrid_weights(
+            regrid, self.in_field.data.size, self.out_field.data.size
+        )
+        regrid.destroy()
+
+        method = self.regrid_args.get("regrid_method")
+        if _is_conservative(self.regrid_args):
+            method = "conservative"
+        elif method in [
+            esmpy.RegridMethod.NEAREST_STOD,
+            esmpy.RegridMethod.NEAREST_DTOS,
+        ]:
+            method = "nearest"
+        else:
+            method = "linear"
+        vertical = vertical_weights(self.input_grid, self.output_grid, method)
+
+        unmapped = unmapped_cells(matrix, self.zero_region, vertical)
+        self._set_weights(matrix, unmapped, vertical)
+
+    def _compute_regrid(self):
+        esmpy = get_esmpy()
+        if self.regrid is not None:
+            self.regrid.destroy()
+        # weights are needed to find the unmapped cells to fill for Region.SELECT,
+        # for Region.EMPTY the whole output is filled before regridding by ESMF
+        factors = self._keep_weights or self.zero_region == esmpy.Region.SELECT
         self.regrid = esmpy.Regrid(
             self.in_field,
             self.out_field,
+            factors=factors,
             **self.regrid_args,
         )
+        matrix = None
+        unmapped = None
+        if factors:
+            matrix = regrid_weights(
+                self.regrid, self.in_field.data.size, self.out_field.data.size
+            )
+            unmapped = unmapped_cells(matrix, self.zero_region)
+        if self._keep_weights:
+            # kept weights are applied as sparse matrix, without a second copy in ESMF
+            self.regrid.destroy()
+            self.regrid = None
+        else:
+            matrix = None
+        self._set_weights(matrix, unmapped)
+
+    def _set_weights(self, matrix, unmapped, vertical=None, *, areas=None):
+        self.weights = RegridWeights(
+            matrix,
+            canonical_shape(self.output_grid),
+            unmapped,
+            vertical,
+            grids=(self.input_grid, self.output_grid),
+            areas=areas,
+        )
+        self._process_weights()
+
+    def _process_weights(self, prune=True):
+        if self.options.sparse:
+            # processed weights are applied as sparse matrix
+            if prune:
+                self.weights.matrix = self._prune(self.weights.matrix)
+            self._crop()
+            self.weights.split(self.options.threads)
+        self._prepare_diagnostics()
+        self.weights.prepare_fill(self.zero_region)
+
+    def _prepare_diagnostics(self):
+        if not self.options.diagnostics:
+            return
+        with ErrorLogger(self.logger):
+            if (
+                self.input_grid.data_location != fm.Location.CELLS
+                or self.output_grid.data_location != fm.Location.CELLS
+            ):
+                raise FinamMetaDataError("Regrid: diagnostics require data on cells")
+        if self.in_field is None or self.out_field is None:
+            self.logger.debug("no ESMF fields for cell areas, skipping diagnostics")
+            return
+
+        self.weights.prepare_diagnostics(
+            cell_areas(self.in_field), cell_areas(self.out_field)
+        )
+
+    def _crop(self):
+        if not self.options.crop_source:
+            return
+
+        shape = canonical_shape(self.input_grid)
+        if self.weights.vertical is not None:
+            shape = shape[:2]
+
+        window_shape = self.weights.crop(shape)
+        if window_shape is not None:
+            self.logger.info(
+                "cropped source to window %s of %d of %d cells",
+                window_shape,
+                np.prod(window_shape),
+                np.prod(shape),
+            )
+
+    def _prune(self, matrix):
+        options = self.options
+        if not options.prune:
+            return matrix
+
+        dst_areas = None
+        if self.out_field is not None and _is_conservative(self.regrid_args):
+            dst_areas = cell_areas(self.out_field)
+
+        pruned, max_error = prune_weights(
+            matrix, options.prune_threshold, options.prune_max_entries, dst_areas
+        )
+        self.weights.prune_info = {
+            "nnz": matrix.nnz,
+            "pruned_nnz": pruned.nnz,
+            "max_error": max_error,
+        }
+        self.logger.info(
+            "pruned weights from %d to %d entries, max. error %g",
+            matrix.nnz,
+            pruned.nnz,
+            max_error,
+        )
+        return pruned
+
+    def _update_regrid(self):
+        old_in, old_out = self.weights.grids
+        in_changed = not _same_grid(self.input_grid, old_in)
+        # output coordinates are transformed to the input CRS, in its coordinate system
+        in_crs_changed = self.input_grid.crs != old_in.crs
+        out_changed = not _same_grid(self.output_grid, old_out) or in_crs_changed
+        if not (in_changed or out_changed):
+            return
+
+        if self.regrid is not None:
+            self.regrid.destroy()
+            self.regrid = None
+
+        changed = None
+        if (
+            not in_changed
+            and self.weights.matrix is not None
+            and _has_independent_rows(self.regrid_args)
+            and same_topology(old_out, self.output_grid)
+        ):
+            changed = changed_cells(old_out, self.output_grid)
+
+        transformer = output_transformer(self.input_grid, self.output_grid)
+        if in_changed:
+            self.in_grid, self.in_field = self._update_esmf(
+                self.in_grid, self.in_field, old_in, self.input_grid, None
+            )
+        if out_changed:
+            self.out_grid, self.out_field = self._update_esmf(
+                self.out_grid,
+                self.out_field,
+                old_out,
+                self.output_grid,
+                transformer,
+                rebuild=in_crs_changed,
+            )
+
+        if changed is not None and set_esmf_mask(
+            self.out_grid, self.output_grid, np.logical_not(changed)
+        ):
+            self._compute_rows(changed)
+        else:
+            self.logger.debug("recalculating all weights")
+            self._keep_weights = True
+            self._compute_regrid()
+
+    def _update_esmf(
+        self, esmf_grid, field, old_grid, new_grid, transformer, *, rebuild=False
+    ):
+        spherical = is_spherical(self.input_grid)
+        if (
+            not rebuild
+            and same_topology(old_grid, new_grid)
+            and update_esmf_coords(esmf_grid, new_grid, transformer, spherical)
+        ):
+            return esmf_grid, field
+
+        field.destroy()
+        esmf_grid.destroy()
+        return to_esmf(new_grid, transformer, spherical)
+
+    def _compute_rows(self, changed):
+        esmpy = get_esmpy()
+        regrid = esmpy.Regrid(
+            self.in_field,
+            self.out_field,
+            factors=True,
+            dst_mask_values=np.array([1], dtype=np.int32),
+            **self.regrid_args,
+        )
+        rows = regrid_weights(regrid, self.in_field.data.size, self.out_field.data.size)
+        regrid.destroy()
+
+        # only the new rows are pruned, the others are already pruned
+        weights = self.weights
+        weights.matrix = replace_rows(weights.matrix, self._prune(rows), changed)
+        weights.unmapped = unmapped_cells(weights.matrix, self.zero_region)
+        weights.grids = (self.input_grid, self.output_grid)
+        self._process_weights(prune=False)
+        self.logger.debug(
+            "recalculated weights for %d of %d cells", np.sum(changed), changed.size
+        )
 
     def _get_data(self, time, target):
-        in_data = self.pull_data(time, target)
+        if self._forward is not None:
+            self._create_reverse()
+
+        in_data = self._pull_canonical(time, target)
+        if self.weights.integrals is not None:
+            conservation = self.weights.diagnose(time, in_data)
+            self.logger.debug(
+                "conservation error at %s: %g (relative %g)",
+                time,
+                conservation["error"],
+                conservation["relative_error"],
+            )
+        scale, offset = self._scaling()
+
+        if self.regrid is None:
+            return self.output_grid.from_canonical(
+                self.weights.apply(in_data, scale=scale, offset=offset)
+            )
+
+        if in_data is not self.in_field.data:
+            self.in_field.data[...] = in_data
+        if self.weights.fill is not None:
+            self.out_field.data[self.weights.fill] = np.nan
 
-        if fm.data.has_masked_values(in_data):
-            with ErrorLogger(self.logger):
-                msg = "Regridding is currently not implemented for masked data"
-                raise NotImplementedError(msg)
+        self.regrid(self.in_field, self.out_field, zero_region=self.zero_region)
 
-        self.in_field.data[...] = self.input_grid.to_canonical(
-            fm.data.strip_time(in_data, self.input_grid).magnitude
-        )
-        self.out_field.data[...] = np.nan
+        if scale == 1.0:
+            out_data = self.out_field.data.copy()
+        else:
+            # scaling during the copy of the output
+            out_data = np.multiply(self.out_field.data, scale)
+        if offset != 0.0:
+            out_data += offset
 
-        self.regrid(self.in_field, self.out_field, zero_region=self.zero_region)
+        return self.output_grid.from_canonical(out_data)
 
-        return self.output_grid.from_canonical(self.out_field.data.copy())
+    def _pull_canonical(self, time, target):
+        in_data = self.pull_data(time, target)
+        return _to_canonical(in_data, self.input_grid, self.logger)
 
-    def _finalize(self):
-        self.regrid.destroy()
-        self.in_field.destroy()
-        self.out_field.destroy()
-        self.in_grid.destroy()
-        self.out_grid.destroy()
+    def _destroy_esmf(self):
+        for esmf_object in [
+            self.regrid,
+            self.in_field,
+            self.out_field,
+            self.in_grid,
+            self.out_grid,
+        ]:
+            if esmf_object is not None:
+                esmf_object.destroy()
 
         self.regrid = None
         self.in_field = None
         self.out_field = None
         self.in_grid = None
         self.out_grid = None
+
+    def _finalize(self):
+        self._destroy_esmf()
+        self.weights = None
+
+
+@dataclasses.dataclass(frozen=True)
+class RegridOptions:
+    """Options of a :class:`.Regrid` adapter, besides the arguments for ESMPy.
+
+    For a description of the options, see :class:`.Regrid`.
+    """
+
+    separable: bool = False
+    out_units: Any = None
+    scale: float = 1.0
+    offset: float = 0.0
+    prune_threshold: Optional[float] = None
+    prune_max_entries: Optional[int] = None
+    crop_source: bool = False
+    threads: Optional[int] = None
+    diagnostics: bool = False
+
+    def __post_init__(self):
+        threshold = self.prune_threshold
+        if threshold is not None and not 0.0 <= threshold < 1.0:
+            raise ValueError("Regrid: prune_threshold must be in [0, 1)")
+        if self.prune_max_entries is not None and self.prune_max_entries < 1:
+            raise ValueError("Regrid: prune_max_entries must be at least 1")
+        if self.threads is not None and self.threads < 1:
+            raise ValueError("Regrid: threads must be at least 1")
+        if self.diagnostics and self.separable:
+            raise ValueError("Regrid: diagnostics are not available for separable")
+
+    @property
+    def prune(self):
+        """bool: Whether weights are pruned."""
+        return self.prune_threshold is not None or self.prune_max_entries is not None
+
+    @property
+    def sparse(self):
+        """bool: Whether weights are applied as sparse matrix, instead of by ESMF."""
+        return self.crop_source or self.threads is not None or self.prune
+
+
+def _to_canonical(in_data, grid, logger):
+    if fm.data.has_masked_values(in_data):
+        with ErrorLogger(logger):
+            msg = "Regridding is currently not implemented for masked data"
+            raise NotImplementedError(msg)
+
+    return grid.to_canonical(fm.data.strip_time(in_data, grid).magnitude)
+
+
+def _encode_option(value):
+    if isinstance(value, enum.Enum):
+        return {"enum": value.__class__.__name__, "name": value.name}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def _decode_option(value):
+    if isinstance(value, dict) and "enum" in value:
+        return getattr(get_esmpy(), value["enum"])[value["name"]]
+    return value
+
+
+def _is_dask_array(data):
+    return type(data).__module__.split(".")[0] == "dask"
+
+
+def _same_grid(grid1, grid2):
+    # fingerprints are cheap to compare, FINAM's comparison is only needed if they differ
+    return (
+        grid1 is grid2
+        or grid_fingerprint(grid1) == grid_fingerprint(grid2)
+        or grid1 == grid2
+    )
+
+
+def _is_transposable(regrid_args):
+    esmpy = get_esmpy()
+    return (
+        regrid_args.get("regrid_method") == esmpy.RegridMethod.CONSERVE
+        and regrid_args.get("extrap_method") is None
+        and regrid_args.get("norm_type", esmpy.NormType.DSTAREA)
+        == esmpy.NormType.DSTAREA
+        and regrid_args.get("src_mask_values") is None
+        and regrid_args.get("dst_mask_values") is None
+    )
+
+
+def _has_independent_rows(regrid_args):
+    # weights of nearest neighbour methods and extrapolation depend on other destination cells
+    esmpy = get_esmpy()
+    return (
+        regrid_args.get("regrid_method")
+        in [
+            None,
+            esmpy.RegridMethod.BILINEAR,
+            esmpy.RegridMethod.PATCH,
+            esmpy.RegridMethod.CONSERVE,
+            esmpy.RegridMethod.CONSERVE_2ND,
+        ]
+        and regrid_args.get("extrap_method") is None
+        and regrid_args.get("dst_mask_values") is None
+    )
+
+
+def _is_conservative(regrid_args):
+    esmpy = get_esmpy()
+    return regrid_args.get("regrid_method") in [
+        esmpy.RegridMethod.CONSERVE,
+        esmpy.RegridMethod.CONSERVE_2ND,
+    ]
@@ -0,0 +1,155 @@
+"""ESMF regridding adapter for multiple targets."""
+
+import finam as fm
+from finam.errors import FinamMetaDataError
+from finam.tools.log_helper import ErrorLogger
+
+from .adapter import Regrid, _to_canonical
+from .tools import is_spherical, to_esmf
+
+
+class RegridFanOut(fm.Adapter):
+    """
+    FINAM adapter for regridding one source to multiple target grids.
+
+    The fan-out adapter is connected to a single source.
+    Targets are added with :meth:`.add_regrid`, which returns a :class:`.Regrid`
+    adapter with its own target grid and regridding options.
+
+    In contrast to several independent :class:`.Regrid` adapters connected to the same output,
+    the ESMF source grid is only created once, data is only pulled once per time step,
+    and each target applies its weights to the shared source field.
+
+    Other inputs connected directly to the fan-out adapter receive the source data unchanged.
+
+    .. warning::
+        Does currently not support masked input data. Raises a ``NotImplementedError`` in that case.
+
+    Examples
+    --------
+
+    .. testcode:: constructor
+
+        import finam as fm
+        import finam_regrid as fmr
+
+        fan_out = fmr.RegridFanOut()
+
+        regrid_fine = fan_out.add_regrid(
+            out_grid=fm.UniformGrid((51, 41), spacing=(0.4, 0.4)),
+        )
+        regrid_coarse = fan_out.add_regrid(
+            out_grid=fm.UniformGrid((11, 9), spacing=(2.0, 2.0)),
+            regrid_method=fmr.RegridMethod.CONSERVE_2ND,
+        )
+
+    Parameters
+    ----------
+
+    in_grid : finam.Grid, optional
+        Input grid specification. Will be retrieved from upstream component if not specified.
+    """
+
+    def __init__(self, in_grid=None):
+        super().__init__()
+        self.input_grid = in_grid
+        self.in_grid = None
+        self.in_field = None
+        self._in_time = None
+        self._has_data = False
+
+    def add_regrid(self, out_grid=None, zero_region=None, **regrid_args):
+        """Adds a target to the fan-out adapter.
+
+        Parameters
+        ----------
+        out_grid : finam.Grid, optional
+            Output grid specification. Will be retrieved from downstream component if not specified.
+        zero_region : Region or None, optional
+            specify which region of the field indices will be zeroed out before
+            adding the values resulting from the interpolation. If None, defaults to Region.TOTAL.
+        **regrid_args : Any
+            Keyword options of :class:`.Regrid`, and keyword arguments passed to the ESMPy class
+            `Regrid <https://earthsystemmodeling.org/esmpy_doc/release/latest/html/regrid.html>`_.
+            See :class:`.Regrid` for details.
+
+        Returns
+        -------
+        Regrid
+            The regridding adapter for the target, already connected to this adapter.
+        """
+        target = _FanOutRegrid(
+            self, out_grid=out_grid, zero_region=zero_region, **regrid_args
+        )
+        self.chain(target)
+        return target
+
+    def _get_info(self, info):
+        if self.in_info is not None:
+            return self.in_info
+
+        in_info = self.exchange_info(info.copy_with(grid=self.input_grid))
+        self.input_grid = self.input_grid or in_info.grid
+        return in_info
+
+    def _get_data(self, time, target):
+        return self.pull_data(time, target)
+
+    def _source_field(self):
+        if self.in_field is None:
+            self.in_grid, self.in_field = to_esmf(
+                self.input_grid, spherical=is_spherical(self.input_grid)
+            )
+        return self.in_grid, self.in_field
+
+    def _pull_canonical(self, time, target):
+        if not self._has_data or self._in_time != time:
+            in_data = self.pull_data(time, target)
+            # targets without ESMF regridding don't create the source field
+            self._source_field()
+            self.in_field.data[...] = _to_canonical(
+                in_data, self.input_grid, self.logger
+            )
+            self._in_time = time
+            self._has_data = True
+
+        return self.in_field.data
+
+    def _finalize(self):
+        if self.in_field is not None:
+            self.in_field.destroy()
+            self.in_grid.destroy()
+
+        self.in_field = None
+        self.in_grid = None
+        self._has_data = False
+
+
+class _FanOutRegrid(Regrid):
+    """Regridding target of a :class:`.RegridFanOut` adapter, sharing its source field."""
+
+    def __init__(self, fan_out, out_grid=None, zero_region=None, **regrid_args):
+        super().__init__(out_grid=out_grid, zero_region=zero_region, **regrid_args)
+        self.fan_out = fan_out
+
+    def update_grids(self, in_grid=None, out_grid=None):
+        with ErrorLogger(self.logger):
+            if in_grid is not None:
+                msg = "Can't update the input grid of a fan-out target"
+                raise FinamMetaDataError(msg)
+        super().update_grids(out_grid=out_grid)
+
+    def _source_field(self):
+        # pylint: disable-next=protected-access
+        return self.fan_out._source_field()
+
+    def _pull_canonical(self, time, target):
+        # pylint: disable-next=protected-access
+        return self.fan_out._pull_canonical(time, target)
+
+    def _destroy_esmf(self):
+        if self.in_field is self.fan_out.in_field:
+            # the shared source field is owned by the fan-out adapter
+            self.in_field = None
+            self.in_grid = None
+        super()._destroy_esmf()
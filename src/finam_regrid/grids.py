@@ -0,0 +1,192 @@
+"""Tools for FINAM grids, independent of ESMF."""
+
+import hashlib
+import weakref
+from functools import reduce
+
+import finam as fm
+import numpy as np
+
+_FINGERPRINTS = {}
+
+
+def axis_shape(i, dim=3):
+    """Shape for reshaping a 1D axis to broadcast along dimension ``i`` of a ``dim``-D array.
+
+    Parameters
+    ----------
+    i : int
+        Dimension of the axis.
+    dim : int, optional
+        Number of dimensions. Default ``3``.
+
+    Returns
+    -------
+    list of int
+        The shape, with ``-1`` at position ``i`` and ``1`` elsewhere.
+    """
+    res = dim * [1]
+    res[i] = -1
+    return res
+
+
+def same_topology(grid1, grid2):
+    """Checks whether two FINAM grids only differ in their coordinates.
+
+    Grids with different CRS never have the same topology,
+    as coordinates in different CRS can't be compared and may need another ESMF coordinate system.
+
+    Parameters
+    ----------
+    grid1 : finam.Grid
+        First grid.
+    grid2 : finam.Grid
+        Second grid.
+
+    Returns
+    -------
+    bool
+        Whether the grids have the same type, CRS, data location, data layout and connectivity.
+    """
+    if (
+        type(grid1) is not type(grid2)
+        or grid1.crs != grid2.crs
+        or grid1.data_location != grid2.data_location
+    ):
+        return False
+    if isinstance(grid1, fm.data.StructuredGrid):
+        return (
+            grid1.dims == grid2.dims
+            and grid1.order == grid2.order
+            and grid1.axes_reversed == grid2.axes_reversed
+            and list(grid1.axes_increase) == list(grid2.axes_increase)
+        )
+    return (
+        grid1.point_count == grid2.point_count
+        and np.array_equal(grid1.cells, grid2.cells)
+        and np.array_equal(grid1.cell_types, grid2.cell_types)
+    )
+
+
+def changed_cells(grid1, grid2):
+    """Data cells (or points) with changed coordinates between two grids of the same topology.
+
+    Parameters
+    ----------
+    grid1 : finam.Grid
+        First grid.
+    grid2 : finam.Grid
+        Second grid, with the same topology as the first one. See :func:`same_topology`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of changed data cells (or points), in the Fortran order of the canonical data.
+    """
+    if isinstance(grid1, fm.data.StructuredGrid):
+        changed = []
+        for i, (ax1, ax2) in enumerate(zip(grid1.axes, grid2.axes)):
+            points = ax1 != ax2
+            if grid1.data_location == fm.Location.CELLS:
+                points = points[:-1] | points[1:]
+            changed.append(points.reshape(axis_shape(i, grid1.dim)))
+        return reduce(np.logical_or, changed).ravel(order="F")
+
+    points = np.any(grid1.points != grid2.points, axis=1)
+    if grid1.data_location == fm.Location.POINTS:
+        return points
+    cells = np.asarray(grid1.cells)
+    return np.any(points[cells] & (cells >= 0), axis=1)
+
+
+def grid_fingerprint(grid, tolerance=None):
+    """Fingerprint of a FINAM grid, for cache keys and checking whether grids match.
+
+    Covers the grid type, shape, data location, order, CRS and the coordinates and cells.
+    The raw array buffers are hashed with BLAKE2b, with a 128 bit digest:
+    32 bit checksums like CRC32 are faster, but collide too often for comparing grids across saved states.
+    Fingerprints are memoized per grid object and tolerance, so FINAM grids must not be modified in place.
+
+    Parameters
+    ----------
+    grid : finam.data.StructuredGrid or finam.data.UnstructuredGrid
+        The grid.
+    tolerance : float, optional
+        Coordinates are quantized to multiples of the tolerance before hashing.
+        Coordinates that differ by less than the tolerance usually give the same fingerprint,
+        but not if they are rounded to different multiples.
+        Default ``None`` (exact coordinates).
+
+    Returns
+    -------
+    str
+        Hexadecimal hash of the grid.
+    """
+    cache = _FINGERPRINTS.get(id(grid))
+    if cache is None:
+        cache = _FINGERPRINTS[id(grid)] = {}
+        weakref.finalize(grid, _FINGERPRINTS.pop, id(grid), None)
+    if tolerance not in cache:
+        cache[tolerance] = _grid_fingerprint(grid, tolerance)
+    return cache[tolerance]
+
+
+def _grid_fingerprint(grid, tolerance):
+    if isinstance(grid, fm.data.StructuredGrid):
+        coords = list(grid.axes)
+        arrays = []
+        meta = (grid.axes_reversed,)
+    elif isinstance(grid, fm.data.UnstructuredGrid):
+        coords = [grid.points]
+        arrays = [grid.cells, grid.cell_types]
+        meta = ()
+    else:
+        raise ValueError(f"Grid type '{grid.__class__.__name__}' not supported.")
+
+    if tolerance is not None:
+        coords = [np.round(np.asarray(c) / tolerance).astype(np.int64) for c in coords]
+        # exact fingerprints don't include the tolerance, to match saved states
+        meta += (tolerance,)
+
+    fingerprint = hashlib.blake2b(digest_size=16)
+    meta += (
+        grid.__class__.__name__,
+        tuple(int(n) for n in grid.data_shape),
+        grid.data_location.name,
+        grid.order,
+        str(grid.crs),
+    )
+    fingerprint.update(repr(meta).encode())
+    for array in coords + arrays:
+        array = np.ascontiguousarray(array)
+        fingerprint.update(f"{array.dtype.str}{array.shape}".encode())
+        fingerprint.update(array.data)
+    return fingerprint.hexdigest()
+
+
+def canonical_shape(grid):
+    """Shape of the canonical data of a FINAM grid, as used by the ESMF fields."""
+    shape = tuple(int(n) for n in grid.data_shape)
+    if isinstance(grid, fm.data.StructuredGrid) and grid.axes_reversed:
+        return shape[::-1]
+    return shape
+
+
+def horizontal_grid(grid):
+    """The horizontal 2D grid of a layered 3D structured grid.
+
+    Parameters
+    ----------
+    grid : finam.data.StructuredGrid
+        A 3D structured grid.
+
+    Returns
+    -------
+    finam.RectilinearGrid
+        The 2D grid of the first two axes, with the same data location and CRS.
+    """
+    return fm.RectilinearGrid(
+        axes=list(grid.axes[:2]),
+        data_location=grid.data_location,
+        crs=grid.crs,
+    )
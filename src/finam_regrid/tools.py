@@ -2,44 +2,117 @@
 
 from __future__ import annotations
 
-import esmpy
+import warnings
+
 import finam as fm
 import numpy as np
 from finam.data.grid_tools import ESMF_TYPE_MAP
 from pyproj import Transformer, crs
+from scipy import sparse
+
+from .grids import grid_fingerprint  # pylint: disable=unused-import
+from .grids import axis_shape
 
 ESMF_DIM_NAMES = ["ESMF:X", "ESMF:Y", "ESMF:Z"]
+ESMF_SPH_DIM_NAMES = ["ESMF:Lon", "ESMF:Lat"]
+
+_DEPRECATED_LOCATIONS = [
+    "ESMF_STAGGER_LOC_2D",
+    "ESMF_STAGGER_LOC_3D",
+    "ESMF_STAGGER_LOC",
+    "ESMF_MESH_LOC",
+]
 
-ESMF_STAGGER_LOC_2D = {
-    fm.Location.CELLS: esmpy.StaggerLoc.CENTER,
-    fm.Location.POINTS: esmpy.StaggerLoc.CORNER,
-}
+_ESMF_CONFIG = {"log": False}
+_ESMPY = None
 
-ESMF_STAGGER_LOC_3D = {
-    fm.Location.CELLS: esmpy.StaggerLoc.CENTER_VCENTER,
-    fm.Location.POINTS: esmpy.StaggerLoc.CORNER_VFACE,
-}
 
-ESMF_STAGGER_LOC = {
-    2: ESMF_STAGGER_LOC_2D,
-    3: ESMF_STAGGER_LOC_3D,
-}
+def configure_esmf(log=False):
+    """Configures ESMF before it is initialized.
+
+    ESMF is initialized when the first regridding adapter is set up.
+    Calling this function afterwards with a different configuration raises an error.
+
+    Parameters
+    ----------
+    log : bool, optional
+        Whether ESMF writes PET log files. Default ``False``.
+    """
+    if _ESMPY is not None and _ESMF_CONFIG["log"] != log:
+        raise ValueError("ESMF is already initialized, can't change its configuration")
+    _ESMF_CONFIG["log"] = log
 
-ESMF_MESH_LOC = {
-    fm.Location.CELLS: esmpy.MeshLoc.ELEMENT,
-    fm.Location.POINTS: esmpy.MeshLoc.NODE,
-}
 
+def get_esmpy():
+    """Imports ESMPy and initializes the ESMF manager on first use.
+
+    Returns
+    -------
+    module
+        The ``esmpy`` module.
+    """
+    global _ESMPY  # pylint: disable=global-statement
+    if _ESMPY is None:
+        import esmpy
+
+        esmpy.Manager(debug=_ESMF_CONFIG["log"])
+        _ESMPY = esmpy
+    return _ESMPY
 
-def _shp(i, dim=3):
-    res = dim * [1]
-    res[i] = -1
-    return res
 
+def _esmf_locations():
+    esmpy = get_esmpy()
+    stagger_2d = {
+        fm.Location.CELLS: esmpy.StaggerLoc.CENTER,
+        fm.Location.POINTS: esmpy.StaggerLoc.CORNER,
+    }
+    stagger_3d = {
+        fm.Location.CELLS: esmpy.StaggerLoc.CENTER_VCENTER,
+        fm.Location.POINTS: esmpy.StaggerLoc.CORNER_VFACE,
+    }
+    return {
+        "ESMF_STAGGER_LOC_2D": stagger_2d,
+        "ESMF_STAGGER_LOC_3D": stagger_3d,
+        "ESMF_STAGGER_LOC": {2: stagger_2d, 3: stagger_3d},
+        "ESMF_MESH_LOC": {
+            fm.Location.CELLS: esmpy.MeshLoc.ELEMENT,
+            fm.Location.POINTS: esmpy.MeshLoc.NODE,
+        },
+    }
 
-def create_transformer(in_crs, out_crs):
+
+def __getattr__(name):
+    # deprecated constants, resolved lazily as they require esmpy
+    if name in _DEPRECATED_LOCATIONS:
+        warnings.warn(
+            f"finam_regrid.tools.{name} is deprecated and will be removed in a future version",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return _esmf_locations()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _stagger_loc(grid_dim, location):
+    return _esmf_locations()["ESMF_STAGGER_LOC"][grid_dim][location]
+
+
+def _mesh_loc(location):
+    return _esmf_locations()["ESMF_MESH_LOC"][location]
+
+
+def create_transformer(in_crs, out_crs, always_xy=False):
     """Creates a transformer for conversion between different CRS.
 
+    Parameters
+    ----------
+    in_crs : Any
+        Source CRS.
+    out_crs : Any
+        Target CRS.
+    always_xy : bool, optional
+        Use x/y (i.e. lon/lat) axis order for geographic CRS. Default ``False``.
+
     Returns
     -------
     Transformer or None
@@ -50,46 +123,102 @@ def create_transformer(in_crs, out_crs):
     transformer = (
         None
         if (in_crs is None and out_crs is None) or in_crs == out_crs
-        else Transformer.from_crs(in_crs, out_crs)
+        else Transformer.from_crs(in_crs, out_crs, always_xy=always_xy)
     )
     return transformer
 
 
+def is_spherical(grid):
+    """Whether ESMF can use spherical coordinates for a grid.
+
+    This is the case for 2D grids with a geographic CRS, with x as longitude and y as latitude.
+    """
+    return grid.dim == 2 and grid.crs is not None and crs.CRS(grid.crs).is_geographic
+
+
+def output_transformer(in_grid, out_grid):
+    """Creates the transformer for the output grid coordinates of a regridding.
+
+    For a spherical input grid (see :func:`is_spherical`), the output coordinates are
+    transformed to longitude and latitude in the input CRS.
+
+    Parameters
+    ----------
+    in_grid : finam.Grid
+        Input grid specification.
+    out_grid : finam.Grid
+        Output grid specification.
+
+    Returns
+    -------
+    Transformer or None
+        Return None if no transform is required.
+    """
+    if is_spherical(in_grid):
+        return create_transformer(out_grid.crs, in_grid.crs, always_xy=True)
+    return create_transformer(in_grid.crs, out_grid.crs)
+
+
 def _transform_points(transformer, points):
     if transformer is None:
         return points
     return np.asarray(list(transformer.itransform(points)))
 
 
-def to_esmf(grid, transformer=None):
-    """Converts a FINAM grid specification to the corresponding ESMF type."""
+def to_esmf(grid, transformer=None, spherical=False):
+    """Converts a FINAM grid specification to the corresponding ESMF type.
+
+    Parameters
+    ----------
+    grid : finam.Grid
+        The grid specification.
+    transformer : Transformer, optional
+        Transformer for the coordinates.
+    spherical : bool, optional
+        Use spherical coordinates in degrees (``CoordSys.SPH_DEG``),
+        with x as longitude and y as latitude. Default ``False``, using cartesian coordinates.
+    """
+    esmpy = get_esmpy()
+    coord_sys = esmpy.CoordSys.SPH_DEG if spherical else esmpy.CoordSys.CART
     if isinstance(grid, fm.data.StructuredGrid):
-        return _to_esmf_grid(grid, transformer)
+        return _to_esmf_grid(grid, transformer, coord_sys)
     if isinstance(grid, fm.UnstructuredPoints):
-        return _to_esmf_points(grid, transformer)
+        return _to_esmf_points(grid, transformer, coord_sys)
     if isinstance(grid, fm.UnstructuredGrid):
-        return _to_esmf_mesh(grid, transformer)
+        return _to_esmf_mesh(grid, transformer, coord_sys)
 
     raise ValueError(f"Grid type '{grid.__class__.__name__}' not supported")
 
 
-def _to_esmf_grid(grid: fm.data.StructuredGrid, transformer):
+def _to_esmf_grid(grid: fm.data.StructuredGrid, transformer, coord_sys):
+    esmpy = get_esmpy()
     dims = np.array([d - 1 for d in grid.dims], dtype=np.int32)
     grid_dim = grid.mesh_dim
-    loc = ESMF_STAGGER_LOC[grid_dim][grid.data_location]
-    p_loc = ESMF_STAGGER_LOC[grid_dim][fm.Location.POINTS]
-    c_loc = ESMF_STAGGER_LOC[grid_dim][fm.Location.CELLS]
+    loc = _stagger_loc(grid_dim, grid.data_location)
+    p_loc = _stagger_loc(grid_dim, fm.Location.POINTS)
+    c_loc = _stagger_loc(grid_dim, fm.Location.CELLS)
     g = esmpy.Grid(
         dims,
         staggerloc=[p_loc, c_loc],
-        coord_sys=esmpy.CoordSys.CART,
+        coord_sys=coord_sys,
     )
+    _set_grid_coords(g, grid, transformer)
+
+    field = esmpy.Field(g, name=grid.name, staggerloc=loc)
+    field.data[:] = np.nan
+    return g, field
+
+
+def _set_grid_coords(g, grid: fm.data.StructuredGrid, transformer):
+    dims = np.array([d - 1 for d in grid.dims], dtype=np.int32)
+    p_loc = _stagger_loc(grid.mesh_dim, fm.Location.POINTS)
+    c_loc = _stagger_loc(grid.mesh_dim, fm.Location.CELLS)
     if transformer is None:
         for i in range(grid.dim):
             grid_corner = g.get_coords(i, staggerloc=p_loc)
             grid_center = g.get_coords(i, staggerloc=c_loc)
-            grid_corner[...] = grid.axes[i].reshape(*_shp(i, grid.dim))
-            grid_center[...] = grid.cell_axes[i].reshape(*_shp(i, grid.dim))
+            grid_corner[...] = grid.axes[i].reshape(*axis_shape(i, grid.dim))
+            grid_center[...] = grid.cell_axes[i].reshape(*axis_shape(i, grid.dim))
     else:
         points = fm.data.grid_tools.gen_points(grid.axes, order="F")
         points = _transform_points(transformer, points)
@@ -101,17 +230,14 @@ def _to_esmf_grid(grid: fm.data.StructuredGrid, transformer):
             grid_corner[...] = points[:, i].reshape(grid.dims, order="F")
             grid_center[...] = cell_centers[:, i].reshape(dims, order="F")
 
-    field = esmpy.Field(g, name=grid.name, staggerloc=loc)
-    field.data[:] = np.nan
-    return g, field
-
 
-def _to_esmf_mesh(grid: fm.UnstructuredGrid, transformer):
-    loc = ESMF_MESH_LOC[grid.data_location]
+def _to_esmf_mesh(grid: fm.UnstructuredGrid, transformer, coord_sys):
+    esmpy = get_esmpy()
+    loc = _mesh_loc(grid.data_location)
     mesh = esmpy.Mesh(
         parametric_dim=grid.mesh_dim,
         spatial_dim=grid.dim,
-        coord_sys=esmpy.CoordSys.CART,
+        coord_sys=coord_sys,
     )
     num_node = grid.point_count
     points = _transform_points(transformer, grid.points)
@@ -130,27 +256,136 @@ def _to_esmf_mesh(grid: fm.UnstructuredGrid, transformer):
         raise ValueError("ESMF can't be used to regrid 1D data.")
 
     num_elem = grid.cell_count
+    centers = _transform_points(transformer, grid.cell_centers)
     mesh.add_elements(
         element_count=num_elem,
         element_ids=np.arange(num_elem, dtype=int) + 1,
         element_types=elem_types,
         element_conn=grid.cells_connectivity.astype(float),
-        element_coords=grid.cell_centers.ravel().astype(float),
+        element_coords=centers.ravel().astype(float),
     )
     field = esmpy.Field(mesh, name=grid.name, meshloc=loc)
     field.data[:] = np.nan
     return mesh, field
 
 
-def _to_esmf_points(grid: fm.UnstructuredPoints, transformer):
-    locstream = esmpy.LocStream(grid.point_count, coord_sys=esmpy.CoordSys.CART)
+def _to_esmf_points(grid: fm.UnstructuredPoints, transformer, coord_sys):
+    esmpy = get_esmpy()
+    locstream = esmpy.LocStream(grid.point_count, coord_sys=coord_sys)
+    _set_locstream_coords(
+        locstream, grid, transformer, coord_sys == esmpy.CoordSys.SPH_DEG
+    )
+
+    field = esmpy.Field(locstream, name=grid.name)
+    field.data[:] = np.nan
+
+    return locstream, field
+
 
+def _set_locstream_coords(
+    locstream, grid: fm.UnstructuredPoints, transformer, spherical
+):
     points = _transform_points(transformer, grid.points)
+    names = ESMF_SPH_DIM_NAMES if spherical else ESMF_DIM_NAMES
 
     for i in range(grid.dim):
-        locstream[ESMF_DIM_NAMES[i]] = points[:, i]
+        locstream[names[i]] = points[:, i]
 
-    field = esmpy.Field(locstream, name=grid.name)
-    field.data[:] = np.nan
 
-    return locstream, field
+def update_esmf_coords(esmf_grid, grid, transformer=None, spherical=False):
+    """Updates the coordinates of an ESMF grid or location stream in place.
+
+    Parameters
+    ----------
+    esmf_grid : esmpy.Grid or esmpy.LocStream or esmpy.Mesh
+        The ESMF object, created by :func:`to_esmf` from a grid of the same topology.
+    grid : finam.Grid
+        Grid specification with the new coordinates.
+    transformer : Transformer, optional
+        Transformer for the coordinates.
+    spherical : bool, optional
+        Whether the ESMF object uses spherical coordinates. Default ``False``.
+
+    Returns
+    -------
+    bool
+        Whether the coordinates could be updated. Meshes can't be updated in place.
+    """
+    esmpy = get_esmpy()
+    if isinstance(esmf_grid, esmpy.Grid):
+        _set_grid_coords(esmf_grid, grid, transformer)
+        return True
+    if isinstance(esmf_grid, esmpy.LocStream):
+        _set_locstream_coords(esmf_grid, grid, transformer, spherical)
+        return True
+    return False
+
+
+def set_esmf_mask(esmf_grid, grid, mask):
+    """Sets the mask of an ESMF grid or location stream.
+
+    Parameters
+    ----------
+    esmf_grid : esmpy.Grid or esmpy.LocStream or esmpy.Mesh
+        The ESMF object, created by :func:`to_esmf`.
+    grid : finam.Grid
+        Grid specification of the ESMF object.
+    mask : numpy.ndarray
+        Boolean array of masked data cells (or points), in the Fortran order of the canonical data.
+
+    Returns
+    -------
+    bool
+        Whether the mask could be set. Masks of meshes can't be set after creation.
+    """
+    esmpy = get_esmpy()
+    values = np.asarray(mask, dtype=np.int32)
+    if isinstance(esmf_grid, esmpy.Grid):
+        loc = _stagger_loc(grid.mesh_dim, grid.data_location)
+        if esmf_grid.mask[loc] is None:
+            esmf_grid.add_item(esmpy.GridItem.MASK, staggerloc=loc)
+        item = esmf_grid.get_item(esmpy.GridItem.MASK, staggerloc=loc)
+        item[...] = values.reshape(item.shape, order="F")
+        return True
+    if isinstance(esmf_grid, esmpy.LocStream):
+        esmf_grid["ESMF:Mask"] = values
+        return True
+    return False
+
+
+def regrid_weights(regrid, src_size, dst_size):
+    """Extracts the weights of an ESMPy regrid as a sparse matrix.
+
+    The regrid must be created with ``factors=True``.
+
+    Parameters
+    ----------
+    regrid : esmpy.Regrid
+        The ESMPy regrid.
+    src_size : int
+        Number of source cells (or points).
+    dst_size : int
+        Number of destination cells (or points).
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Weights of shape ``(dst_size, src_size)``, operating on data in Fortran order.
+    """
+    weights = regrid.get_weights_dict(deep_copy=True)
+    return sparse.csr_matrix(
+        (weights["weights"], (weights["row_dst"] - 1, weights["col_src"] - 1)),
+        shape=(dst_size, src_size),
+    )
+
+
+def cell_areas(field):
+    """Cell areas of an ESMPy field, in Fortran order.
+
+    The field's data is restored after area calculation.
+    """
+    data = field.data.copy()
+    field.get_area()
+    areas = field.data.ravel(order="F").copy()
+    field.data[...] = data
+    return areas
@@ -0,0 +1,800 @@
+"""Tools for sparse regridding weights."""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import finam as fm
+import numpy as np
+from scipy import sparse
+
+from .grids import grid_fingerprint
+from .tools import get_esmpy
+
+
+class RegridWeights:
+    """Regridding weights, and the state derived from them for regridding.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix or None
+        Weights of shape ``(dst_size, src_size)``, operating on canonical data in Fortran order.
+        For separable regridding, the horizontal weights.
+        ``None`` if the weights are only applied by ESMF.
+    shape : tuple of int
+        Canonical shape of the destination data.
+    unmapped : numpy.ndarray or None, optional
+        Boolean array of unmapped destination cells to fill with ``NaN``. See :func:`unmapped_cells`.
+    vertical : scipy.sparse.csr_matrix, optional
+        Vertical weights for separable regridding. See :func:`vertical_weights`.
+    grids : tuple of finam.Grid, optional
+        Input and output grid the weights were calculated for.
+        ``None`` for weights restored from a state, before they are checked against the grids.
+    areas : tuple of numpy.ndarray, optional
+        Source and destination cell areas, for area-weighted weights,
+        applied as ``(matrix @ (src_areas * data)) / dst_areas``.
+        Used for the transposed weights of the reverse direction, which share the forward weights.
+        Not supported for cropping, splitting and separable regridding.
+
+    Attributes
+    ----------
+    fingerprints : tuple of str or None
+        Fingerprints of the input and output grid of weights restored from a state.
+    window : tuple of slice or None
+        Window of the source cells the weights are cropped to. See :meth:`crop`.
+    cropped : scipy.sparse.csr_matrix or None
+        Weights restricted to the source window.
+    fill : Ellipsis or tuple of numpy.ndarray or None
+        Index of the output cells to fill with ``NaN`` before regridding by ESMF. See :meth:`prepare_fill`.
+    integrals : numpy.ndarray or None
+        Source cell areas and area-weighted column sums of the weights, for conservation diagnostics.
+    conservation : dict or None
+        Result of the last conservation diagnostics. See :meth:`diagnose`.
+    blocks : list of tuple or None
+        Row blocks of the applied weights, for applying them with multiple threads. See :meth:`split`.
+    prune_info : dict or None
+        Entry counts and maximum introduced error of the last pruning.
+    """
+
+    def __init__(
+        self, matrix, shape, unmapped=None, vertical=None, *, grids=None, areas=None
+    ):
+        self.matrix = matrix
+        self.shape = tuple(shape)
+        self.unmapped = unmapped
+        self.vertical = vertical
+        self.grids = grids
+        self.areas = areas
+        self.fingerprints = None
+        self.window = None
+        self.cropped = None
+        self.blocks = None
+        self.fill = None
+        self.integrals = None
+        self.conservation = None
+        self.prune_info = None
+
+    def crop(self, shape):
+        """Restricts the weights to the window of the source cells with non-zero weights.
+
+        Parameters
+        ----------
+        shape : tuple of int
+            Canonical shape of the source data the weights operate on.
+
+        Returns
+        -------
+        tuple of int or None
+            Shape of the window, or ``None`` if the window covers the whole source.
+        """
+        self.window = None
+        self.cropped = None
+        self.blocks = None
+        window = source_window(self.matrix, shape)
+        if window is None:
+            return None
+        window_shape = tuple(w.stop - w.start for w in window)
+        if window_shape == tuple(shape):
+            return None
+
+        self.window = window
+        self.cropped = crop_weights(self.matrix, shape, window)
+        return window_shape
+
+    def split(self, threads):
+        """Splits the applied weights into row blocks, once for all applications with multiple threads.
+
+        Needs to be called again after the weights are cropped or changed.
+
+        Parameters
+        ----------
+        threads : int or None
+            Number of threads to apply the weights with. ``None`` or ``1`` for a single thread.
+        """
+        self.blocks = None
+        if threads is not None and threads > 1:
+            self.blocks = split_rows(
+                self.matrix if self.window is None else self.cropped, threads
+            )
+
+    def prepare_fill(self, zero_region):
+        """Prepares the index of the output cells to fill with ``NaN`` before regridding by ESMF.
+
+        Parameters
+        ----------
+        zero_region : Region or None
+            Zero region used for the regridding. If None, defaults to Region.TOTAL.
+        """
+        esmpy = get_esmpy()
+        self.fill = None
+        if zero_region in [None, esmpy.Region.TOTAL]:
+            # all cells are zeroed out by ESMF
+            return
+        if zero_region != esmpy.Region.SELECT:
+            self.fill = ...
+        elif self.unmapped is not None:
+            self.fill = np.unravel_index(
+                np.flatnonzero(self.unmapped), self.shape, order="F"
+            )
+
+    def prepare_diagnostics(self, src_areas, dst_areas):
+        """Prepares the integrals for conservation diagnostics.
+
+        Parameters
+        ----------
+        src_areas : numpy.ndarray
+            Cell areas of the source, in Fortran order.
+        dst_areas : numpy.ndarray
+            Cell areas of the destination, in Fortran order.
+        """
+        # source integral, and target integral as area-weighted column sums of the weights
+        if self.areas is None:
+            target = self.matrix.T @ dst_areas
+        else:
+            target = self.areas[0] * (self.matrix.T @ (dst_areas / self.areas[1]))
+        self.integrals = np.stack([src_areas, target])
+
+    def diagnose(self, time, data):
+        """Calculates the global conservation error for canonical source data.
+
+        Parameters
+        ----------
+        time : datetime.datetime
+            Time of the data.
+        data : numpy.ndarray
+            Canonical source data.
+
+        Returns
+        -------
+        dict
+            Time, source and target integral, and the absolute and relative error.
+        """
+        source, target = self.integrals @ np.ravel(data, order="F")
+        error = target - source
+        self.conservation = {
+            "time": time,
+            "source": source,
+            "target": target,
+            "error": error,
+            "relative_error": error / source if source != 0.0 else np.nan,
+        }
+        return self.conservation
+
+    def apply(self, data, *, scale=1.0, offset=0.0):
+        """Applies the weights to canonical data. See :func:`apply_weights`."""
+        matrix = self.matrix
+        if self.window is not None:
+            matrix = self.cropped
+            data = data[self.window]
+        return apply_weights(
+            matrix,
+            data,
+            self.shape,
+            self.unmapped,
+            vertical=self.vertical,
+            areas=self.areas,
+            scale=scale,
+            offset=offset,
+            blocks=self.blocks,
+        )
+
+    def apply_stack(self, data, *, scale=1.0, offset=0.0):
+        """Applies the weights to a stack of canonical data. See :func:`apply_weights_stack`."""
+        matrix = self.matrix
+        if self.window is not None:
+            matrix = self.cropped
+            data = data[(slice(None),) + self.window]
+        return apply_weights_stack(
+            matrix,
+            data,
+            self.shape,
+            self.unmapped,
+            vertical=self.vertical,
+            areas=self.areas,
+            scale=scale,
+            offset=offset,
+            blocks=self.blocks,
+        )
+
+    def apply_lazy(self, data, *, scale=1.0, offset=0.0):
+        """Applies the weights to canonical data lazily, using dask. See :func:`apply_weights_lazy`."""
+        matrix = self.matrix
+        if self.window is not None:
+            matrix = self.cropped
+            data = data[self.window]
+        return apply_weights_lazy(
+            matrix,
+            data,
+            self.shape,
+            self.unmapped,
+            vertical=self.vertical,
+            areas=self.areas,
+            scale=scale,
+            offset=offset,
+        )
+
+    def to_state(self):
+        """Arrays of the weights and the grid fingerprints, for saving them in a state.
+
+        Returns
+        -------
+        dict of numpy.ndarray
+            The arrays, with the sparse matrices split into their components.
+        """
+        in_grid, out_grid = self.grids
+        matrix = self.matrix
+        if self.areas is not None:
+            # area-weighted weights are saved as plain weights
+            src_areas, dst_areas = self.areas
+            matrix = transpose_weights(matrix.T, dst_areas, src_areas)
+        state = {
+            "in_grid": grid_fingerprint(in_grid),
+            "out_grid": grid_fingerprint(out_grid),
+            "shape": np.array(self.shape),
+            **_sparse_state("weights", matrix),
+        }
+        if self.vertical is not None:
+            state.update(_sparse_state("vertical", self.vertical))
+        if self.unmapped is not None:
+            state["unmapped"] = self.unmapped
+        if self.integrals is not None:
+            state["integrals"] = self.integrals
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Restores weights from the arrays of a state. See :meth:`to_state`.
+
+        Parameters
+        ----------
+        state : mapping of numpy.ndarray
+            The arrays of the state.
+
+        Returns
+        -------
+        RegridWeights
+            The restored weights, with the grid fingerprints to check.
+        """
+        weights = cls(
+            _load_sparse(state, "weights"),
+            tuple(int(n) for n in state["shape"]),
+            unmapped=state["unmapped"] if "unmapped" in state else None,
+            vertical=_load_sparse(state, "vertical"),
+        )
+        weights.fingerprints = (str(state["in_grid"]), str(state["out_grid"]))
+        weights.integrals = state["integrals"] if "integrals" in state else None
+        return weights
+
+
+def _sparse_state(name, matrix):
+    matrix = matrix.tocsr()
+    return {
+        f"{name}_data": matrix.data,
+        f"{name}_indices": matrix.indices,
+        f"{name}_indptr": matrix.indptr,
+        f"{name}_shape": np.array(matrix.shape),
+    }
+
+
+def _load_sparse(state, name):
+    if f"{name}_data" not in state:
+        return None
+    return sparse.csr_matrix(
+        (state[f"{name}_data"], state[f"{name}_indices"], state[f"{name}_indptr"]),
+        shape=tuple(state[f"{name}_shape"]),
+    )
+
+
+def transpose_weights(weights, src_areas, dst_areas):
+    """Derives reverse conservative weights from forward conservative weights.
+
+    Only valid for first order conservative weights with destination area normalization.
+    The reverse weights are a new matrix. To share the forward weights instead,
+    apply their transpose as area-weighted weights (see :class:`RegridWeights`).
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Forward weights of shape ``(dst_size, src_size)``.
+    src_areas : numpy.ndarray
+        Cell areas of the forward source, in Fortran order.
+    dst_areas : numpy.ndarray
+        Cell areas of the forward destination, in Fortran order.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Reverse weights of shape ``(src_size, dst_size)``.
+    """
+    return sparse.csr_matrix(
+        sparse.diags(1.0 / src_areas) @ weights.T @ sparse.diags(dst_areas)
+    )
+
+
+def replace_rows(weights, rows, replace):
+    """Replaces rows of sparse weights.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Weights of shape ``(dst_size, src_size)``.
+    rows : scipy.sparse.spmatrix
+        Weights of the same shape, with entries only in the replaced rows.
+    replace : numpy.ndarray
+        Boolean array of replaced rows.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        The updated weights.
+    """
+    keep = sparse.diags(np.logical_not(replace).astype(float))
+    return sparse.csr_matrix(keep @ weights + rows)
+
+
+def source_window(weights, shape):
+    """Index window of the source cells with non-zero weights.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Weights of shape ``(dst_size, src_size)``.
+    shape : tuple of int
+        Canonical shape of the source data the weights operate on.
+
+    Returns
+    -------
+    tuple of slice or None
+        Bounding window of the used source cells, or ``None`` if no source cell is used.
+    """
+    weights = sparse.csr_matrix(weights)
+    cols = np.unique(weights.indices[weights.data != 0])
+    if cols.size == 0:
+        return None
+    index = np.unravel_index(cols, shape, order="F")
+    return tuple(slice(int(i.min()), int(i.max()) + 1) for i in index)
+
+
+def crop_weights(weights, shape, window):
+    """Restricts weights to the source cells in a window.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Weights of shape ``(dst_size, src_size)``.
+    shape : tuple of int
+        Canonical shape of the source data the weights operate on.
+    window : tuple of slice
+        Source window, see :func:`source_window`.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Weights operating on the source data sliced by the window, in Fortran order.
+    """
+    size = int(np.prod(shape))
+    cols = np.arange(size).reshape(shape, order="F")[window].ravel(order="F")
+    return sparse.csr_matrix(weights)[:, cols]
+
+
+def prune_weights(weights, threshold=None, max_entries=None, dst_areas=None):
+    """Drops small weights and renormalizes the remaining ones.
+
+    Without destination areas, row sums are preserved (partition of unity).
+    With destination areas, area weighted column sums are preserved (conservation).
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Weights of shape ``(dst_size, src_size)``.
+    threshold : float, optional
+        Drop weights with an absolute value below this fraction of the largest absolute weight in their row.
+    max_entries : int, optional
+        Maximum number of weights per row. Keeps the weights with the largest absolute values.
+    dst_areas : numpy.ndarray, optional
+        Cell areas of the destination, in Fortran order, for conservative weights.
+
+    Returns
+    -------
+    tuple(scipy.sparse.csr_matrix, float)
+        The pruned weights, and the maximum error introduced for an input bounded by 1,
+        i.e. the maximum absolute row sum of the weight differences.
+    """
+    weights = sparse.csr_matrix(weights)
+    weights.sum_duplicates()
+    rows = np.repeat(np.arange(weights.shape[0]), np.diff(weights.indptr))
+    magnitude = np.abs(weights.data)
+    keep = np.ones(weights.nnz, dtype=bool)
+
+    if threshold is not None:
+        row_max = abs(weights).max(axis=1).toarray().ravel()
+        keep &= magnitude >= threshold * row_max[rows]
+    if max_entries is not None:
+        order = np.lexsort((-magnitude, rows))
+        rank = np.empty(weights.nnz, dtype=int)
+        rank[order] = np.arange(weights.nnz) - weights.indptr[rows[order]]
+        keep &= rank < max_entries
+
+    pruned = sparse.csr_matrix(
+        (weights.data[keep], (rows[keep], weights.indices[keep])),
+        shape=weights.shape,
+    )
+    if dst_areas is None:
+        before = np.asarray(weights.sum(axis=1)).ravel()
+        after = np.asarray(pruned.sum(axis=1)).ravel()
+        factors = np.divide(before, after, out=np.ones_like(before), where=after != 0)
+        pruned = sparse.diags(factors) @ pruned
+    else:
+        before = dst_areas @ weights
+        after = dst_areas @ pruned
+        factors = np.divide(before, after, out=np.ones_like(before), where=after != 0)
+        pruned = pruned @ sparse.diags(factors)
+
+    pruned = sparse.csr_matrix(pruned)
+    max_error = abs(weights - pruned).sum(axis=1).max() if weights.nnz else 0.0
+    return pruned, float(max_error)
+
+
+def unmapped_cells(weights, zero_region=None, vertical=None):
+    """Destination cells without weights, that are not zeroed out.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Weights of shape ``(dst_size, src_size)``.
+    zero_region : Region or None, optional
+        Zero region used for the regridding. If None, defaults to Region.TOTAL.
+    vertical : scipy.sparse.spmatrix, optional
+        Vertical weights for separable regridding. See :func:`vertical_weights`.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Boolean array of unmapped cells, or None if all cells are written.
+    """
+    if zero_region is None or zero_region == get_esmpy().Region.TOTAL:
+        return None
+    unmapped = weights.getnnz(axis=1) == 0
+    if vertical is not None:
+        unmapped = np.logical_or.outer(vertical.getnnz(axis=1) == 0, unmapped).ravel()
+    return unmapped if np.any(unmapped) else None
+
+
+def apply_weights(
+    weights,
+    data,
+    shape,
+    unmapped=None,
+    *,
+    vertical=None,
+    areas=None,
+    scale=1.0,
+    offset=0.0,
+    threads=None,
+    blocks=None,
+):
+    """Applies sparse weights to canonical data.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.spmatrix
+        Weights of shape ``(dst_size, src_size)``.
+        For separable regridding, the horizontal weights.
+    data : numpy.ndarray
+        Canonical source data.
+    shape : tuple of int
+        Canonical shape of the destination data.
+    unmapped : numpy.ndarray or None, optional
+        Boolean array of destination cells to fill with ``NaN``. See :func:`unmapped_cells`.
+    vertical : scipy.sparse.spmatrix, optional
+        Vertical weights for separable regridding. See :func:`vertical_weights`.
+    areas : tuple of numpy.ndarray, optional
+        Source and destination cell areas in Fortran order, for area-weighted weights.
+        The weights are applied as ``(weights @ (src_areas * data)) / dst_areas``.
+        Not supported for separable regridding.
+    scale : float, optional
+        Factor applied to the result. Default ``1.0``.
+    offset : float, optional
+        Offset added to the result, after scaling. Default ``0.0``.
+    threads : int, optional
+        Number of threads to apply the weights with, partitioning the destination cells.
+        Default ``None`` (single-threaded).
+        The weights are split for each call; use ``blocks`` when applying them repeatedly.
+    blocks : list of tuple, optional
+        Row blocks of the weights from :func:`split_rows`, applied with one thread each.
+        Takes precedence over ``threads``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Canonical destination data.
+    """
+    if vertical is None:
+        data = np.ravel(data, order="F")
+        if areas is not None:
+            data = areas[0] * data
+        result = _matmul(weights, data, threads, blocks)
+        if areas is not None:
+            result /= areas[1]
+        if scale != 1.0:
+            result *= scale
+    else:
+        # scaling the small vertical weights instead of the result
+        vertical = vertical if scale == 1.0 else vertical * scale
+        layers = np.reshape(data, (-1, vertical.shape[1]), order="F")
+        result = (vertical @ _matmul(weights, layers, threads, blocks).T).ravel()
+    if offset != 0.0:
+        result += offset
+    if unmapped is not None:
+        result[unmapped] = np.nan
+    return result.reshape(shape, order="F")
+
+
+def apply_weights_stack(
+    weights,
+    data,
+    shape,
+    unmapped=None,
+    *,
+    vertical=None,
+    areas=None,
+    scale=1.0,
+    offset=0.0,
+    threads=None,
+    blocks=None,
+):
+    """Applies sparse weights to a stack of canonical data, in a single sparse product.
+
+    For parameters, see :func:`apply_weights`.
+    In contrast to there, ``data`` has the shape ``(n_times, *canonical_shape)``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Canonical destination data of shape ``(n_times, *shape)``.
+    """
+    data = np.asarray(data)
+    steps = data.shape[0]
+    layers = 1 if vertical is None else vertical.shape[1]
+    # source cells in Fortran order as rows, time steps (and layers) as columns
+    data = np.reshape(data, (steps, -1, layers), order="F").transpose(1, 0, 2)
+    data = data.reshape(data.shape[0], -1)
+    if areas is not None:
+        data = areas[0][:, np.newaxis] * data
+    result = _matmul(weights, data, threads, blocks)
+    result = result.reshape(-1, steps, layers)
+
+    if vertical is None:
+        result = result[:, :, 0].T
+        if areas is not None:
+            result /= areas[1]
+        if scale != 1.0:
+            result *= scale
+    else:
+        vertical = vertical if scale == 1.0 else vertical * scale
+        result = (vertical @ result.reshape(-1, layers).T).T
+        result = result.reshape(-1, steps, vertical.shape[0]).transpose(1, 0, 2)
+        result = result.reshape(steps, -1, order="F")
+    if offset != 0.0:
+        result += offset
+    if unmapped is not None:
+        result[:, unmapped] = np.nan
+    return result.reshape((steps,) + tuple(shape), order="F")
+
+
+def split_rows(weights, parts):
+    """Splits sparse weights into row blocks with similar numbers of entries.
+
+    The blocks share the buffers of the weights.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.csr_matrix
+        Weights of shape ``(dst_size, src_size)``.
+    parts : int
+        Maximum number of blocks.
+
+    Returns
+    -------
+    list of tuple(int, int, scipy.sparse.csr_matrix)
+        First and end row, and weights of each block.
+    """
+    weights = sparse.csr_matrix(weights)
+    bounds = np.searchsorted(
+        weights.indptr, np.linspace(0, weights.nnz, parts + 1), side="left"
+    )
+    bounds[0], bounds[-1] = 0, weights.shape[0]
+    bounds = np.unique(bounds)
+
+    blocks = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        first, last = weights.indptr[start], weights.indptr[stop]
+        # assigning the slices, as the constructor may copy small views
+        block = sparse.csr_matrix((stop - start, weights.shape[1]), dtype=weights.dtype)
+        block.data = weights.data[first:last]
+        block.indices = weights.indices[first:last]
+        block.indptr = weights.indptr[start : stop + 1] - first
+        blocks.append((int(start), int(stop), block))
+    return blocks
+
+
+def _matmul(weights, data, threads, blocks):
+    if blocks is None:
+        if threads is None or threads <= 1 or not sparse.isspmatrix_csr(weights):
+            return weights @ data
+        blocks = split_rows(weights, threads)
+    if len(blocks) <= 1:
+        return weights @ data
+
+    result = np.empty(
+        (weights.shape[0],) + data.shape[1:],
+        dtype=np.result_type(weights.dtype, data.dtype),
+    )
+
+    def apply_block(start, stop, block):
+        # scipy releases the GIL in the sparse product
+        result[start:stop] = block @ data
+
+    pool = _thread_pool(len(blocks))
+    futures = [pool.submit(apply_block, *block) for block in blocks]
+    for future in futures:
+        future.result()
+    return result
+
+
+@lru_cache(maxsize=None)
+def _thread_pool(threads):
+    return ThreadPoolExecutor(max_workers=threads, thread_name_prefix="finam-regrid")
+
+
+def apply_weights_lazy(
+    weights,
+    data,
+    shape,
+    unmapped=None,
+    *,
+    vertical=None,
+    areas=None,
+    scale=1.0,
+    offset=0.0,
+):
+    """Applies sparse weights to canonical data lazily, chunk by chunk, using dask.
+
+    Each chunk of the source data is multiplied by the weights of its source cells,
+    and the partial results are summed up.
+    The full source data is never materialized.
+    For parameters, see :func:`apply_weights`.
+
+    As FINAM converts dask arrays to NumPy arrays when passing data to adapters,
+    this is meant for offline regridding outside of a composition.
+    :meth:`.Regrid.regrid_stack` uses it for dask arrays,
+    with the grid layout and unit conversion of the adapter.
+
+    Returns
+    -------
+    dask.array.Array
+        Lazy canonical destination data.
+    """
+    import dask.array as da
+
+    weights = sparse.csr_matrix(weights)
+    layers = 1 if vertical is None else vertical.shape[1]
+    # reshaping in Fortran order, as transposed C order
+    data = da.asarray(data).T.reshape((layers, -1)).T
+    if areas is not None:
+        data = data * areas[0][:, np.newaxis]
+
+    bounds = np.cumsum((0,) + data.chunks[0])
+    parts = [
+        da.map_blocks(
+            _apply_block,
+            data.blocks[i, :],
+            weights[:, bounds[i] : bounds[i + 1]],
+            chunks=((weights.shape[0],), data.chunks[1]),
+            dtype=np.result_type(weights.dtype, data.dtype),
+        )
+        for i in range(len(bounds) - 1)
+    ]
+    result = da.stack(parts).sum(axis=0)
+
+    if vertical is None:
+        result = result[:, 0]
+        if areas is not None:
+            result = result / areas[1]
+        if scale != 1.0:
+            result = result * scale
+    else:
+        vertical = vertical if scale == 1.0 else vertical * scale
+        result = da.map_blocks(
+            _apply_block,
+            result.T.rechunk(-1),
+            vertical,
+            chunks=((vertical.shape[0],), (weights.shape[0],)),
+        ).ravel()
+    if offset != 0.0:
+        result = result + offset
+    if unmapped is not None:
+        result = da.where(unmapped, np.nan, result)
+    return result.reshape(shape[::-1]).T
+
+
+def _apply_block(block, weights):
+    return weights @ block
+
+
+def vertical_weights(src_grid, dst_grid, method="linear"):
+    """Weights for 1D regridding along the vertical axis of layered 3D structured grids.
+
+    Parameters
+    ----------
+    src_grid : finam.data.StructuredGrid
+        The 3D source grid.
+    dst_grid : finam.data.StructuredGrid
+        The 3D destination grid.
+    method : str, optional
+        One of ``"linear"``, ``"nearest"`` or ``"conservative"``. Default ``"linear"``.
+        Conservative weights require data at cells
+        and are normalized by the destination layer thickness.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Weights of shape ``(dst_layers, src_layers)``.
+        Destination layers outside the source range have no weights.
+    """
+    cells = src_grid.data_location == fm.Location.CELLS
+    if method == "conservative":
+        if not cells:
+            raise ValueError("Conservative vertical weights require data at cells")
+        src, dst = np.asarray(src_grid.axes[2]), np.asarray(dst_grid.axes[2])
+        src_lo, src_hi = np.minimum(src[:-1], src[1:]), np.maximum(src[:-1], src[1:])
+        dst_lo, dst_hi = np.minimum(dst[:-1], dst[1:]), np.maximum(dst[:-1], dst[1:])
+        overlap = np.minimum.outer(dst_hi, src_hi) - np.maximum.outer(dst_lo, src_lo)
+        overlap = np.maximum(overlap, 0.0) / (dst_hi - dst_lo)[:, None]
+        return sparse.csr_matrix(overlap)
+
+    src = np.asarray(src_grid.cell_axes[2] if cells else src_grid.axes[2])
+    dst = np.asarray(dst_grid.cell_axes[2] if cells else dst_grid.axes[2])
+    order = np.argsort(src)
+    src = src[order]
+
+    if method == "nearest":
+        upper = np.clip(np.searchsorted(src, dst), 1, src.size - 1)
+        nearest = np.where(dst - src[upper - 1] <= src[upper] - dst, upper - 1, upper)
+        if src.size == 1:
+            nearest = np.zeros_like(upper)
+        return sparse.csr_matrix(
+            (np.ones(dst.size), (np.arange(dst.size), order[nearest])),
+            shape=(dst.size, src.size),
+        )
+
+    inside = np.flatnonzero((dst >= src[0]) & (dst <= src[-1]))
+    upper = np.clip(np.searchsorted(src, dst[inside]), 1, src.size - 1)
+    lower = upper - 1
+    frac = (dst[inside] - src[lower]) / (src[upper] - src[lower])
+    return sparse.csr_matrix(
+        (
+            np.concatenate([1.0 - frac, frac]),
+            (np.concatenate([inside, inside]), order[np.concatenate([lower, upper])]),
+        ),
+        shape=(dst.size, src.size),
+    )
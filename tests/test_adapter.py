@@ -1,14 +1,24 @@
+import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta
 
 import finam as fm
 import numpy as np
 
-from finam_regrid import Regrid, RegridMethod
+try:
+    import dask.array as da
+except ImportError:
+    da = None
+
+from finam_regrid import ExtrapMethod, Region, Regrid, RegridFanOut, RegridMethod
+from finam_regrid.tools import output_transformer
 
 
 class TestAdapter(unittest.TestCase):
-    def setup_run(self, in_grid, out_grid, regrid_method, masked=False):
+    def setup_run(
+        self, in_grid, out_grid, regrid_method, masked=False, adapter=None, **kwargs
+    ):
         time = datetime(2000, 1, 1)
         in_info = fm.Info(
             time=time,
@@ -46,11 +56,8 @@ class TestAdapter(unittest.TestCase):
 
         self.composition = fm.Composition([self.source, self.sink], log_level="WARN")
 
-        (
-            self.source.outputs["Output"]
-            >> Regrid(regrid_method=regrid_method)
-            >> self.sink.inputs["Input"]
-        )
+        self.regrid = adapter or Regrid(regrid_method=regrid_method, **kwargs)
+        self.source.outputs["Output"] >> self.regrid >> self.sink.inputs["Input"]
 
     def test_adapter_grid_nearest(self):
         self.setup_run(
@@ -138,6 +145,290 @@ class TestAdapter(unittest.TestCase):
         self.assertEqual(result[0, 1, 0], 1.0 * fm.UNITS.meter)
         self.assertEqual(result[0, 1, 1], 1.0 * fm.UNITS.meter)
 
+    def test_adapter_grid_units(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19)),
+            out_units="cm",
+            scale=2.0,
+            offset=1.0,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        result = self.sink.data["Input"]
+        self.assertEqual(fm.data.get_units(result), fm.UNITS.Unit("cm"))
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 0, 0], 201.0)
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 2, 2], 1.0)
+
+    def test_adapter_grid_units_fail(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19)),
+            out_units="s",
+        )
+        with self.assertRaises(fm.FinamMetaDataError):
+            self.composition.run(end_time=datetime(2000, 1, 2))
+
+    def test_adapter_grid_pruned(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19)),
+            prune_threshold=0.5,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        result = self.sink.data["Input"]
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 0, 0], 1.0)
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 2, 2], 0.0)
+
+    def test_adapter_grid_threads(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19)),
+            threads=3,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+        self.assertEqual(len(self.regrid.weights.blocks), 3)
+
+        result = self.sink.data["Input"]
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 0, 0], 1.0)
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 1, 1], 1.0)
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 2, 2], 0.0)
+
+    def test_adapter_grid_diagnostics(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19)),
+            diagnostics=True,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        conservation = self.regrid.conservation
+        self.assertEqual(conservation["time"], datetime(2000, 1, 2))
+        self.assertAlmostEqual(conservation["source"], 4.0)
+        self.assertAlmostEqual(conservation["target"], 4.0)
+        self.assertAlmostEqual(conservation["error"], 0.0)
+        self.assertAlmostEqual(conservation["relative_error"], 0.0)
+
+    def test_adapter_diagnostics_fail(self):
+        with self.assertRaises(ValueError):
+            Regrid(diagnostics=True, separable=True)
+
+        self.setup_run(
+            regrid_method=RegridMethod.BILINEAR,
+            in_grid=fm.UniformGrid(dims=(5, 10), data_location=fm.Location.POINTS),
+            out_grid=fm.UniformGrid(dims=(9, 19), data_location=fm.Location.POINTS),
+            diagnostics=True,
+        )
+        with self.assertRaises(fm.FinamMetaDataError):
+            self.composition.run(end_time=datetime(2000, 1, 2))
+
+    def test_adapter_grid_unmapped(self):
+        for kwargs in [
+            {},
+            {"threads": 2},
+            {"prune_threshold": 0.1},
+            {"crop_source": True},
+        ]:
+            self.setup_run(
+                regrid_method=RegridMethod.CONSERVE,
+                in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+                out_grid=fm.UniformGrid(dims=(12, 22)),
+                zero_region=Region.SELECT,
+                **kwargs,
+            )
+            self.composition.run(end_time=datetime(2000, 1, 3))
+
+            result = fm.data.get_magnitude(self.sink.data["Input"])
+            self.assertAlmostEqual(result[0, 0, 0], 1.0)
+            self.assertAlmostEqual(result[0, 2, 2], 0.0)
+            self.assertTrue(np.isnan(result[0, 10, 20]))
+            self.assertEqual(np.sum(np.isnan(result)), 11 * 21 - 8 * 18)
+
+    def test_adapter_grid_unmapped_empty(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(12, 22)),
+            zero_region=Region.EMPTY,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 3))
+
+        # the whole output is filled before regridding, without extracting weights
+        self.assertIsNone(self.regrid.weights.matrix)
+        self.assertIs(self.regrid.weights.fill, ...)
+        self.assertIsNone(self.regrid.weights.unmapped)
+
+    def test_adapter_grid_extrap(self):
+        self.setup_run(
+            regrid_method=RegridMethod.BILINEAR,
+            in_grid=fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(12, 22)),
+            zero_region=Region.SELECT,
+            extrap_method=ExtrapMethod.NEAREST_IDAVG,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 3))
+
+        result = fm.data.get_magnitude(self.sink.data["Input"])
+        self.assertIsNone(self.regrid.weights.fill)
+        self.assertFalse(np.any(np.isnan(result)))
+
+    def test_adapter_prune_fail(self):
+        with self.assertRaises(ValueError):
+            Regrid(prune_threshold=1.0)
+        with self.assertRaises(ValueError):
+            Regrid(prune_max_entries=0)
+        with self.assertRaises(ValueError):
+            Regrid(threads=0)
+
+    def test_adapter_grid_cropped(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(50, 40)),
+            out_grid=fm.UniformGrid(
+                dims=(5, 4), spacing=(0.5, 0.5, 0.5), origin=(0.25, 0.25)
+            ),
+            crop_source=True,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        result = self.sink.data["Input"]
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 0, 0], 1.0)
+        self.assertAlmostEqual(fm.data.get_magnitude(result)[0, 2, 2], 0.0)
+
+    def test_adapter_state(self):
+        in_grid = fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0))
+        out_grid = fm.UniformGrid(dims=(9, 19))
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=in_grid,
+            out_grid=out_grid,
+            zero_region=Region.SELECT,
+        )
+        self.composition.connect()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "regrid.npz")
+            self.regrid.save_state(path)
+            self.composition.run(end_time=datetime(2000, 1, 2))
+            expected = fm.data.get_magnitude(self.sink.data["Input"])
+
+            restored = Regrid.load_state(path)
+            self.assertEqual(
+                restored.regrid_args["regrid_method"], RegridMethod.CONSERVE
+            )
+            self.assertEqual(restored.zero_region, Region.SELECT)
+
+            self.setup_run(
+                regrid_method=None,
+                in_grid=in_grid,
+                out_grid=out_grid,
+                adapter=restored,
+            )
+            self.composition.run(end_time=datetime(2000, 1, 2))
+            np.testing.assert_allclose(
+                fm.data.get_magnitude(self.sink.data["Input"]), expected
+            )
+            self.assertIsNone(restored.in_field)
+
+            self.setup_run(
+                regrid_method=None,
+                in_grid=in_grid,
+                out_grid=fm.UniformGrid(dims=(9, 18)),
+                adapter=Regrid.load_state(path),
+            )
+            with self.assertRaises(fm.FinamMetaDataError):
+                self.composition.run(end_time=datetime(2000, 1, 2))
+
+    def test_adapter_stack(self):
+        in_grid = fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0))
+        out_grid = fm.UniformGrid(dims=(9, 19))
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=in_grid,
+            out_grid=out_grid,
+            scale=2.0,
+        )
+        self.composition.connect()
+
+        stack = np.zeros((3,) + in_grid.data_shape)
+        stack[:, 0, 0] = [1.0, 2.0, 3.0]
+        result = self.regrid.regrid_stack(stack)
+
+        self.assertEqual(result.shape, (3,) + out_grid.data_shape)
+        np.testing.assert_allclose(result[:, 0, 0], [2.0, 4.0, 6.0])
+        np.testing.assert_allclose(result[:, 2, 2], 0.0)
+
+        blocks = list(self.regrid.regrid_stack(iter([stack[:2], stack[2:]])))
+        self.assertEqual(len(blocks), 2)
+        np.testing.assert_allclose(np.concatenate(blocks), result)
+
+        # a list of time steps is a single stack
+        np.testing.assert_allclose(self.regrid.regrid_stack(list(stack)), result)
+        quantity = fm.UNITS.Quantity(stack * 1000.0, "mm")
+        np.testing.assert_allclose(self.regrid.regrid_stack(quantity), result)
+
+        self.composition.run(end_time=datetime(2000, 1, 2))
+        np.testing.assert_allclose(
+            fm.data.get_magnitude(self.sink.data["Input"])[0], result[0]
+        )
+
+    @unittest.skipIf(da is None, "dask not installed")
+    def test_adapter_stack_lazy(self):
+        in_grid = fm.UniformGrid(
+            dims=(5, 10), spacing=(2.0, 2.0, 2.0), axes_reversed=True
+        )
+        out_grid = fm.UniformGrid(dims=(9, 19))
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=in_grid,
+            out_grid=out_grid,
+            out_units="mm",
+        )
+        self.composition.connect()
+
+        stack = np.random.default_rng(1).random((4,) + in_grid.data_shape)
+        expected = self.regrid.regrid_stack(stack)
+        result = self.regrid.regrid_stack(da.from_array(stack, chunks=(1, 3, 2)))
+
+        self.assertIsInstance(result, da.Array)
+        self.assertEqual(result.shape, (4,) + out_grid.data_shape)
+        np.testing.assert_allclose(result.compute(), expected)
+
+    def test_adapter_grid_separable(self):
+        self.setup_run(
+            regrid_method=RegridMethod.CONSERVE,
+            in_grid=fm.UniformGrid(dims=(5, 10, 4), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19, 7)),
+            separable=True,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        result = fm.data.get_magnitude(self.sink.data["Input"])
+        self.assertEqual(result.shape, (1, 8, 18, 6))
+        self.assertAlmostEqual(result[0, 0, 0, 0], 1.0)
+        self.assertAlmostEqual(result[0, 1, 1, 1], 1.0)
+        self.assertAlmostEqual(result[0, 2, 2, 2], 0.0)
+
+    def test_adapter_grid_separable_linear(self):
+        self.setup_run(
+            regrid_method=RegridMethod.BILINEAR,
+            in_grid=fm.UniformGrid(dims=(5, 10, 4), spacing=(2.0, 2.0, 2.0)),
+            out_grid=fm.UniformGrid(dims=(9, 19, 7)),
+            separable=True,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        result = fm.data.get_magnitude(self.sink.data["Input"])
+        self.assertEqual(result.shape, (1, 8, 18, 6))
+        self.assertAlmostEqual(result[0, 1, 1, 1], 0.75**3)
+        self.assertAlmostEqual(result[0, 2, 2, 2], 0.25**3)
+
     def test_adapter_grid_crs(self):
         out_grid = fm.UniformGrid(
             dims=(9, 19), data_location=fm.Location.POINTS, crs="EPSG:25832"
@@ -169,6 +460,392 @@ class TestAdapter(unittest.TestCase):
             fm.data.get_magnitude(self.sink.data["Input"])[0, 1, 1], 0.25
         )
 
+    def test_adapter_grid_spherical(self):
+        out_grid = fm.UniformGrid(
+            dims=(9, 19), data_location=fm.Location.POINTS, crs="EPSG:4326"
+        )
+        self.setup_run(
+            regrid_method=RegridMethod.BILINEAR,
+            in_grid=fm.UniformGrid(
+                dims=(5, 10),
+                spacing=(2.0, 2.0, 2.0),
+                data_location=fm.Location.POINTS,
+                crs="EPSG:4326",
+            ),
+            out_grid=out_grid,
+        )
+        self.composition.run(end_time=datetime(2000, 1, 2))
+
+        result = fm.data.get_magnitude(self.sink.data["Input"])
+        self.assertAlmostEqual(result[0, 0, 0], 1.0)
+        self.assertAlmostEqual(result[0, 0, 1], 0.5, places=3)
+        self.assertAlmostEqual(result[0, 1, 0], 0.5, places=3)
+        self.assertAlmostEqual(result[0, 1, 1], 0.25, places=2)
+
+    def test_adapter_fan_out(self):
+        time = datetime(2000, 1, 1)
+        in_info = fm.Info(
+            time=time,
+            grid=fm.UniformGrid(
+                dims=(5, 10),
+                spacing=(2.0, 2.0, 2.0),
+                data_location=fm.Location.POINTS,
+            ),
+            units="m",
+        )
+        in_data = np.zeros(shape=in_info.grid.data_shape, order=in_info.grid.order)
+        in_data.data[0, 0] = 1.0
+
+        source = fm.components.CallbackGenerator(
+            callbacks={"Output": (lambda t: in_data.copy(), in_info)},
+            start=time,
+            step=timedelta(days=1),
+        )
+        sink_1 = fm.components.DebugConsumer(
+            {"Input": fm.Info(None, grid=None, units=None)},
+            start=time,
+            step=timedelta(days=1),
+        )
+        sink_2 = fm.components.DebugConsumer(
+            {"Input": fm.Info(None, grid=None, units=None)},
+            start=time,
+            step=timedelta(days=1),
+        )
+        composition = fm.Composition([source, sink_1, sink_2], log_level="WARN")
+
+        fan_out = RegridFanOut()
+        source.outputs["Output"] >> fan_out
+
+        pulls = []
+        pull_data = fan_out.pull_data
+
+        def count_pulls(time, target):
+            pulls.append(time)
+            return pull_data(time, target)
+
+        fan_out.pull_data = count_pulls
+
+        regrid_1 = fan_out.add_regrid(
+            out_grid=fm.UniformGrid(dims=(9, 19), data_location=fm.Location.POINTS),
+            regrid_method=RegridMethod.BILINEAR,
+        )
+        regrid_2 = fan_out.add_regrid(
+            out_grid=fm.UniformGrid(dims=(9, 19), data_location=fm.Location.POINTS),
+            regrid_method=RegridMethod.NEAREST_STOD,
+        )
+        regrid_1 >> sink_1.inputs["Input"]
+        regrid_2 >> sink_2.inputs["Input"]
+
+        composition.connect()
+        self.assertIsNotNone(fan_out.in_field)
+        self.assertIs(regrid_1.in_field, fan_out.in_field)
+        self.assertIs(regrid_2.in_field, fan_out.in_field)
+
+        composition.run(end_time=datetime(2000, 1, 5))
+
+        # the source is pulled only once per time step
+        self.assertGreater(len(pulls), 0)
+        self.assertEqual(len(pulls), len(set(pulls)))
+
+        result = sink_1.data["Input"]
+        self.assertEqual(result[0, 0, 0], 1.0 * fm.UNITS.meter)
+        self.assertEqual(result[0, 0, 1], 0.5 * fm.UNITS.meter)
+        self.assertEqual(result[0, 1, 1], 0.25 * fm.UNITS.meter)
+
+        result = sink_2.data["Input"]
+        self.assertEqual(result[0, 0, 0], 1.0 * fm.UNITS.meter)
+        self.assertEqual(result[0, 0, 2], 0.0 * fm.UNITS.meter)
+
+    def test_adapter_reverse(self):
+        time = datetime(2000, 1, 1)
+        grid_a = fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0))
+        grid_b = fm.UniformGrid(dims=(9, 19))
+
+        data_a = np.zeros(shape=grid_a.data_shape, order=grid_a.order)
+        data_a.data[0, 0] = 1.0
+        data_b = np.zeros(shape=grid_b.data_shape, order=grid_b.order)
+        data_b.data[0, 0] = 1.0
+
+        source = fm.components.CallbackGenerator(
+            callbacks={
+                "A": (lambda t: data_a.copy(), fm.Info(time, grid=grid_a, units="m")),
+                "B": (lambda t: data_b.copy(), fm.Info(time, grid=grid_b, units="m")),
+            },
+            start=time,
+            step=timedelta(days=1),
+        )
+        sink = fm.components.DebugConsumer(
+            {
+                "A": fm.Info(None, grid=None, units=None),
+                "B": fm.Info(None, grid=None, units=None),
+            },
+            start=time,
+            step=timedelta(days=1),
+        )
+        composition = fm.Composition([source, sink], log_level="WARN")
+
+        forward = Regrid(regrid_method=RegridMethod.CONSERVE, out_grid=grid_b)
+        reverse = forward.reverse()
+
+        source.outputs["A"] >> forward >> sink.inputs["B"]
+        source.outputs["B"] >> reverse >> sink.inputs["A"]
+
+        composition.connect()
+        # only the sparse weights are kept, without the ESMF regrid object
+        self.assertIsNone(forward.regrid)
+        self.assertIsNotNone(forward.weights.matrix)
+
+        composition.run(end_time=datetime(2000, 1, 5))
+
+        self.assertIsNone(reverse.regrid)
+        self.assertIsNotNone(reverse.weights.matrix)
+        # the transposed weights share the forward weights
+        self.assertIsNotNone(reverse.weights.areas)
+        self.assertTrue(
+            np.shares_memory(reverse.weights.matrix.data, forward.weights.matrix.data)
+        )
+
+        result = fm.data.get_magnitude(sink.data["B"])
+        self.assertEqual(result[0, 0, 0], 1.0)
+        self.assertEqual(result[0, 1, 1], 1.0)
+        self.assertEqual(result[0, 2, 2], 0.0)
+
+        result = fm.data.get_magnitude(sink.data["A"])
+        self.assertEqual(sink.inputs["A"].info.grid, grid_a)
+        self.assertAlmostEqual(result[0, 0, 0], 0.25)
+        self.assertAlmostEqual(result[0, 1, 1], 0.0)
+
+    def test_adapter_reverse_initialized(self):
+        time = datetime(2000, 1, 1)
+        grid_a = fm.UniformGrid(dims=(5, 10), spacing=(2.0, 2.0, 2.0))
+        grid_b = fm.UniformGrid(dims=(9, 19))
+
+        data_a = np.zeros(shape=grid_a.data_shape, order=grid_a.order)
+        data_a.data[0, 0] = 1.0
+        data_b = np.zeros(shape=grid_b.data_shape, order=grid_b.order)
+        data_b.data[0, 0] = 1.0
+
+        source = fm.components.CallbackGenerator(
+            callbacks={
+                "A": (lambda t: data_a.copy(), fm.Info(time, grid=grid_a, units="m")),
+                "B": (lambda t: data_b.copy(), fm.Info(time, grid=grid_b, units="m")),
+            },
+            start=time,
+            step=timedelta(days=1),
+        )
+        source.initialize()
+
+        forward = Regrid(regrid_method=RegridMethod.CONSERVE)
+        source.outputs["A"] >> forward
+        forward.get_info(fm.Info(None, grid=grid_b, units=None))
+        self.assertIsNotNone(forward.regrid)
+        self.assertIsNone(forward.weights.matrix)
+
+        with self.assertRaises(TypeError):
+            forward.reverse(regrid_method=RegridMethod.CONSERVE)
+
+        # reverse adapter created after the initialization of the forward adapter
+        reverse = forward.reverse(threads=2)
+        source.outputs["B"] >> reverse
+        reverse.get_info(fm.Info(None, grid=None, units=None))
+
+        source.connect(time)
+        source.connect(time)
+        source.validate()
+
+        result = fm.data.get_magnitude(reverse.get_data(time, None))
+        self.assertIsNone(reverse.regrid)
+        self.assertIsNone(reverse.in_field)
+        # weights applied with threads have their own matrix
+        self.assertIsNone(reverse.weights.areas)
+        self.assertEqual(reverse.options.threads, 2)
+        self.assertIsNone(forward.regrid)
+        self.assertIsNotNone(forward.weights.matrix)
+        self.assertAlmostEqual(result[0, 0, 0], 0.25)
+        self.assertAlmostEqual(result[0, 1, 1], 0.0)
+
+        result = fm.data.get_magnitude(forward.get_data(time, None))
+        self.assertEqual(result[0, 0, 0], 1.0)
+        self.assertEqual(result[0, 2, 2], 0.0)
+
+        forward.finalize()
+        reverse.finalize()
+
+    def test_adapter_update_grids(self):
+        for method, partial in [
+            (RegridMethod.BILINEAR, True),
+            (RegridMethod.NEAREST_STOD, False),
+        ]:
+            with self.subTest(method=method):
+                self._check_update_grids(method, partial)
+
+    def _check_update_grids(self, regrid_method, partial):
+        time = datetime(2000, 1, 1)
+        in_grid = fm.UniformGrid(dims=(21, 17), data_location=fm.Location.POINTS)
+        in_data = in_grid.data_points[:, 0] + 2.0 * in_grid.data_points[:, 1]
+        in_data = in_data.reshape(in_grid.data_shape, order=in_grid.order)
+
+        source = fm.components.CallbackGenerator(
+            callbacks={"Output": (lambda t: in_data.copy(), fm.Info(time, in_grid))},
+            start=time,
+            step=timedelta(days=1),
+        )
+        adapter = Regrid(regrid_method=regrid_method)
+        source.initialize()
+        source.outputs["Output"] >> adapter
+
+        # points of the output grids coincide with input points, for exact nearest neighbours
+        x_axis = np.linspace(1.0, 19.0, 10)
+        y_axis = np.linspace(1.0, 15.0, 8)
+        out_grid = fm.RectilinearGrid(
+            [x_axis, y_axis], data_location=fm.Location.POINTS
+        )
+        adapter.get_info(fm.Info(None, grid=out_grid))
+        source.connect(time)
+        source.connect(time)
+        source.validate()
+
+        def check():
+            result = fm.data.get_magnitude(adapter.get_data(time, None))[0]
+            points = adapter.output_grid.data_points
+            expected = points[:, 0] + 2.0 * points[:, 1]
+            expected = expected.reshape(
+                adapter.output_grid.data_shape, order=adapter.output_grid.order
+            )
+            np.testing.assert_allclose(result, expected)
+
+        check()
+
+        x_axis = x_axis.copy()
+        x_axis[3] += 1.0
+        with self.assertLogs(adapter.logger, level="DEBUG") as logs:
+            adapter.update_grids(
+                out_grid=fm.RectilinearGrid(
+                    [x_axis, y_axis], data_location=fm.Location.POINTS
+                )
+            )
+        self.assertIn("recalculating all weights", logs.output[-1])
+        self.assertIs(adapter.info.grid, adapter.output_grid)
+        self.assertIsNone(adapter.regrid)
+        self.assertIsNotNone(adapter.weights.matrix)
+        check()
+
+        x_axis = x_axis.copy()
+        x_axis[5] += 1.0
+        with self.assertLogs(adapter.logger, level="DEBUG") as logs:
+            adapter.update_grids(
+                out_grid=fm.RectilinearGrid(
+                    [x_axis, y_axis], data_location=fm.Location.POINTS
+                )
+            )
+        if partial:
+            self.assertIn("recalculated weights for 8 of 80 cells", logs.output[-1])
+        else:
+            self.assertIn("recalculating all weights", logs.output[-1])
+        self.assertIs(adapter.info.grid, adapter.output_grid)
+        check()
+
+        adapter.finalize()
+
+    def test_adapter_update_grids_crs(self):
+        time = datetime(2000, 1, 1)
+        in_grid = fm.UniformGrid(
+            dims=(21, 17), data_location=fm.Location.POINTS, crs="EPSG:32632"
+        )
+        in_data = in_grid.data_points[:, 0] + 2.0 * in_grid.data_points[:, 1]
+        in_data = in_data.reshape(in_grid.data_shape, order=in_grid.order)
+
+        source = fm.components.CallbackGenerator(
+            callbacks={"Output": (lambda t: in_data.copy(), fm.Info(time, in_grid))},
+            start=time,
+            step=timedelta(days=1),
+        )
+        adapter = Regrid(regrid_method=RegridMethod.BILINEAR)
+        source.initialize()
+        source.outputs["Output"] >> adapter
+
+        x_axis = np.linspace(3.0, 17.0, 8)
+        y_axis = np.linspace(1.0, 15.0, 8)
+        out_grid = fm.RectilinearGrid(
+            [x_axis, y_axis], data_location=fm.Location.POINTS, crs="EPSG:32632"
+        )
+        adapter.get_info(fm.Info(None, grid=out_grid))
+        source.connect(time)
+        source.connect(time)
+        source.validate()
+
+        def check():
+            result = fm.data.get_magnitude(adapter.get_data(time, None))[0]
+            transformer = output_transformer(in_grid, adapter.output_grid)
+            points = adapter.output_grid.data_points
+            if transformer is not None:
+                points = np.asarray(list(transformer.itransform(points)))
+            expected = points[:, 0] + 2.0 * points[:, 1]
+            expected = expected.reshape(
+                adapter.output_grid.data_shape, order=adapter.output_grid.order
+            )
+            np.testing.assert_allclose(result, expected, atol=1e-4)
+
+        check()
+
+        # same coordinates, with the false easting of the output CRS shifted by 2 m
+        crs = (
+            "+proj=tmerc +lat_0=0 +lon_0=9 +k=0.9996 +x_0=500002 +y_0=0 "
+            "+datum=WGS84 +units=m +no_defs"
+        )
+        with self.assertLogs(adapter.logger, level="DEBUG") as logs:
+            adapter.update_grids(
+                out_grid=fm.RectilinearGrid(
+                    [x_axis, y_axis], data_location=fm.Location.POINTS, crs=crs
+                )
+            )
+        self.assertIn("recalculating all weights", logs.output[-1])
+        self.assertIsNotNone(output_transformer(in_grid, adapter.output_grid))
+        check()
+
+        adapter.finalize()
+
+    def test_adapter_update_grids_pruned(self):
+        time = datetime(2000, 1, 1)
+        in_grid = fm.UniformGrid(dims=(21, 17))
+        in_data = np.ones(in_grid.data_shape, order=in_grid.order)
+
+        source = fm.components.CallbackGenerator(
+            callbacks={"Output": (lambda t: in_data.copy(), fm.Info(time, in_grid))},
+            start=time,
+            step=timedelta(days=1),
+        )
+        adapter = Regrid(regrid_method=RegridMethod.CONSERVE, prune_threshold=0.3)
+        source.initialize()
+        source.outputs["Output"] >> adapter
+
+        x_axis = np.linspace(1.3, 18.7, 10)
+        y_axis = np.linspace(1.3, 14.7, 8)
+        adapter.get_info(fm.Info(None, grid=fm.RectilinearGrid([x_axis, y_axis])))
+        source.connect(time)
+        source.connect(time)
+        source.validate()
+
+        x_axis = x_axis.copy()
+        x_axis[3] += 0.4
+        adapter.update_grids(out_grid=fm.RectilinearGrid([x_axis, y_axis]))
+        weights = adapter.weights.matrix.toarray()
+
+        x_axis = x_axis.copy()
+        x_axis[5] += 0.4
+        adapter.update_grids(out_grid=fm.RectilinearGrid([x_axis, y_axis]))
+
+        # weights of unchanged cells are not pruned again
+        unchanged = np.ones((9, 7), dtype=bool)
+        unchanged[4:6, :] = False
+        unchanged = unchanged.ravel(order="F")
+        np.testing.assert_allclose(
+            adapter.weights.matrix.toarray()[unchanged], weights[unchanged]
+        )
+        self.assertLess(adapter.prune_info["pruned_nnz"], adapter.prune_info["nnz"])
+
+        adapter.finalize()
+
     def test_adapter_mesh_nearest(self):
         self.setup_run(
             regrid_method=RegridMethod.NEAREST_STOD,
@@ -0,0 +1,71 @@
+import unittest
+
+import finam as fm
+import numpy as np
+
+from finam_regrid.grids import changed_cells, grid_fingerprint, same_topology
+
+
+class TestGrids(unittest.TestCase):
+    def test_grid_fingerprint(self):
+        grid = fm.UniformGrid(dims=(5, 4))
+        self.assertEqual(
+            grid_fingerprint(grid), grid_fingerprint(fm.UniformGrid(dims=(5, 4)))
+        )
+        self.assertNotEqual(
+            grid_fingerprint(grid),
+            grid_fingerprint(fm.UniformGrid(dims=(5, 4), spacing=(2.0, 1.0))),
+        )
+        self.assertNotEqual(
+            grid_fingerprint(grid),
+            grid_fingerprint(fm.UniformGrid(dims=(5, 4), data_location="POINTS")),
+        )
+        self.assertNotEqual(
+            grid_fingerprint(grid), grid_fingerprint(grid.to_unstructured())
+        )
+
+        with self.assertRaises(ValueError):
+            grid_fingerprint(fm.NoGrid())
+
+        # quantized coordinates
+        shifted = fm.UniformGrid(dims=(5, 4), origin=(1e-9, 0.0))
+        self.assertNotEqual(grid_fingerprint(grid), grid_fingerprint(shifted))
+        self.assertEqual(
+            grid_fingerprint(grid, tolerance=1e-6),
+            grid_fingerprint(shifted, tolerance=1e-6),
+        )
+        self.assertNotEqual(
+            grid_fingerprint(grid), grid_fingerprint(grid, tolerance=1e-6)
+        )
+
+        # memoized per grid object
+        grid = fm.UniformGrid(dims=(5, 4)).to_unstructured()
+        fingerprint = grid_fingerprint(grid)
+        grid.points[0, 0] = 100.0
+        self.assertEqual(grid_fingerprint(grid), fingerprint)
+
+    def test_changed_cells(self):
+        grid1 = fm.RectilinearGrid([np.arange(5.0), np.arange(4.0)])
+        grid2 = fm.RectilinearGrid(
+            [np.array([0.0, 1.0, 2.5, 3.0, 4.0]), np.arange(4.0)]
+        )
+        grid3 = fm.RectilinearGrid([np.arange(6.0), np.arange(4.0)])
+
+        self.assertTrue(same_topology(grid1, grid2))
+        self.assertFalse(same_topology(grid1, grid3))
+        self.assertFalse(
+            same_topology(
+                grid1,
+                fm.RectilinearGrid([np.arange(5.0), np.arange(4.0)], crs="EPSG:32632"),
+            )
+        )
+
+        changed = changed_cells(grid1, grid2).reshape(grid1.data_shape, order="F")
+        self.assertEqual(changed.tolist()[0], [False, False, False])
+        self.assertEqual(changed.tolist()[1], [True, True, True])
+        self.assertEqual(changed.tolist()[2], [True, True, True])
+        self.assertEqual(changed.tolist()[3], [False, False, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,60 @@
+import subprocess
+import sys
 import unittest
+from unittest import mock
 
 import esmpy
 import finam as fm
+import numpy as np
 from numpy.testing import assert_allclose
 
-from finam_regrid.tools import to_esmf
+from finam_regrid import tools
+from finam_regrid.tools import is_spherical, regrid_weights, to_esmf, update_esmf_coords
+from finam_regrid.weights import apply_weights
 
 
 class TestTools(unittest.TestCase):
+    def test_lazy_import(self):
+        code = "import sys, finam_regrid; print('esmpy' in sys.modules)"
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(out.stdout.strip(), "False")
+
+        code = "import sys, finam_regrid; finam_regrid.RegridMethod; print('esmpy' in sys.modules)"
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(out.stdout.strip(), "True")
+
+    def test_configure_esmf(self):
+        with mock.patch.object(tools, "_ESMPY", None), mock.patch.dict(
+            tools._ESMF_CONFIG
+        ), mock.patch.object(esmpy, "Manager") as manager:
+            tools.configure_esmf(log=True)
+            self.assertIs(tools.get_esmpy(), esmpy)
+            manager.assert_called_once_with(debug=True)
+
+            # ESMF is initialized only once
+            tools.get_esmpy()
+            manager.assert_called_once()
+
+            # the same configuration is accepted after initialization
+            tools.configure_esmf(log=True)
+            with self.assertRaises(ValueError):
+                tools.configure_esmf(log=False)
+
+    def test_deprecated_locations(self):
+        with self.assertWarns(DeprecationWarning):
+            stagger_loc = tools.ESMF_STAGGER_LOC
+        self.assertEqual(stagger_loc[2][fm.Location.CELLS], esmpy.StaggerLoc.CENTER)
+        with self.assertWarns(DeprecationWarning):
+            self.assertEqual(
+                tools.ESMF_MESH_LOC[fm.Location.POINTS], esmpy.MeshLoc.NODE
+            )
+        with self.assertRaises(AttributeError):
+            _ = tools.ESMF_UNKNOWN
+
     def test_to_esmf_fail(self):
         with self.assertRaises(ValueError):
             g, f = to_esmf(fm.NoGrid())
@@ -38,6 +85,20 @@ class TestTools(unittest.TestCase):
             g.get_coords(1, staggerloc=esmpy.StaggerLoc.CORNER)[0, :], grid.axes[1]
         )
 
+    def test_to_esmf_grid_spherical(self):
+        grid = fm.UniformGrid((20, 15), crs="EPSG:4326")
+        self.assertTrue(is_spherical(grid))
+        self.assertFalse(is_spherical(fm.UniformGrid((20, 15), crs="EPSG:32632")))
+        self.assertFalse(is_spherical(fm.UniformGrid((20, 15))))
+
+        g, f = to_esmf(grid, spherical=True)
+
+        self.assertIsInstance(g, esmpy.Grid)
+        self.assertEqual(g.coord_sys, esmpy.CoordSys.SPH_DEG)
+        assert_allclose(
+            g.get_coords(0, staggerloc=esmpy.StaggerLoc.CORNER)[:, 0], grid.axes[0]
+        )
+
     def test_to_esmf_mesh(self):
         points = [
             [0, 0],
@@ -94,6 +155,40 @@ class TestTools(unittest.TestCase):
 
         self.assertTrue(all(f == 2 for f in f2))
 
+    def test_regrid_weights(self):
+        grid1 = fm.UniformGrid((21, 17))
+        grid2 = fm.UniformGrid((11, 9), spacing=(2.0, 2.0))
+
+        g1, f1 = to_esmf(grid1)
+        g2, f2 = to_esmf(grid2)
+
+        regrid = esmpy.Regrid(
+            f1,
+            f2,
+            regrid_method=esmpy.RegridMethod.CONSERVE,
+            unmapped_action=esmpy.UnmappedAction.IGNORE,
+            factors=True,
+        )
+        weights = regrid_weights(regrid, f1.data.size, f2.data.size)
+        self.assertEqual(weights.shape, (f2.data.size, f1.data.size))
+
+        f1.data[...] = np.random.random(f1.data.shape)
+        regrid(f1, f2)
+
+        assert_allclose(apply_weights(weights, f1.data, f2.data.shape), f2.data)
+
+    def test_update_esmf_coords(self):
+        grid1 = fm.RectilinearGrid([np.arange(5.0), np.arange(4.0)])
+        grid2 = fm.RectilinearGrid(
+            [np.array([0.0, 1.0, 2.5, 3.0, 4.0]), np.arange(4.0)]
+        )
+
+        g, f = to_esmf(grid1)
+        self.assertTrue(update_esmf_coords(g, grid2))
+        assert_allclose(
+            g.get_coords(0, staggerloc=esmpy.StaggerLoc.CORNER)[:, 0], grid2.axes[0]
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
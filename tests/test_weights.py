@@ -0,0 +1,241 @@
+import unittest
+
+import finam as fm
+import numpy as np
+from numpy.testing import assert_allclose
+from scipy import sparse
+
+try:
+    import dask.array as da
+except ImportError:
+    da = None
+
+from finam_regrid.weights import (
+    RegridWeights,
+    apply_weights,
+    apply_weights_lazy,
+    apply_weights_stack,
+    crop_weights,
+    prune_weights,
+    source_window,
+    split_rows,
+    transpose_weights,
+)
+
+
+class TestWeights(unittest.TestCase):
+    def test_transpose_weights(self):
+        # two source cells of size 1, one destination cell of size 2
+        weights = sparse.csr_matrix([[0.5, 0.5]])
+        reverse = transpose_weights(weights, np.array([1.0, 1.0]), np.array([2.0]))
+
+        self.assertEqual(reverse.shape, (2, 1))
+        assert_allclose(reverse.toarray(), [[1.0], [1.0]])
+
+        result = apply_weights(reverse, np.array([3.0]), (2,))
+        assert_allclose(result, [3.0, 3.0])
+
+        # transpose applied as area-weighted weights, sharing the forward weights
+        areas = (np.array([2.0]), np.array([1.0, 1.0]))
+        result = apply_weights(weights.T, np.array([3.0]), (2,), areas=areas)
+        assert_allclose(result, [3.0, 3.0])
+        result = apply_weights_stack(
+            weights.T, np.array([[3.0], [1.0]]), (2,), areas=areas
+        )
+        assert_allclose(result, [[3.0, 3.0], [1.0, 1.0]])
+
+        grids = (fm.UniformGrid(dims=(2, 2)), fm.UniformGrid(dims=(2, 3)))
+        shared = RegridWeights(weights.T, (2,), grids=grids, areas=areas)
+        assert_allclose(shared.apply(np.array([3.0]), scale=2.0), [6.0, 6.0])
+        shared.prepare_diagnostics(areas[0], areas[1])
+        assert_allclose(shared.integrals, [[2.0], [2.0]])
+        state = shared.to_state()
+        assert_allclose(
+            RegridWeights.from_state(state).matrix.toarray(), reverse.toarray()
+        )
+
+    def test_prune_weights(self):
+        weights = sparse.csr_matrix(
+            [[0.9, 0.1, 0.0], [0.0, 0.5, 0.5], [0.6, 0.3, 0.1], [0.0, 0.0, 0.0]]
+        )
+        pruned, error = prune_weights(weights, threshold=0.2)
+
+        assert_allclose(
+            pruned.toarray(),
+            [[1.0, 0.0, 0.0], [0.0, 0.5, 0.5], [2 / 3, 1 / 3, 0.0], [0.0, 0.0, 0.0]],
+        )
+        assert_allclose(pruned.sum(axis=1).A1, [1.0, 1.0, 1.0, 0.0])
+        self.assertAlmostEqual(error, 0.2)
+
+        pruned, error = prune_weights(weights, max_entries=1)
+        self.assertEqual(pruned.nnz, 3)
+        assert_allclose(pruned.sum(axis=1).A1, [1.0, 1.0, 1.0, 0.0])
+
+        # conservative: area-weighted column sums are preserved
+        areas = np.array([1.0, 2.0, 1.0, 1.0])
+        pruned, _error = prune_weights(weights, threshold=0.2, dst_areas=areas)
+        assert_allclose(
+            pruned.T @ areas, weights.T @ areas * (pruned.T @ areas > 0), atol=1e-12
+        )
+
+    def test_crop_weights(self):
+        shape = (6, 5)
+        weights = sparse.lil_matrix((2, 30))
+        weights[0, np.ravel_multi_index((2, 1), shape, order="F")] = 0.5
+        weights[0, np.ravel_multi_index((3, 3), shape, order="F")] = 0.5
+        weights[1, np.ravel_multi_index((2, 2), shape, order="F")] = 1.0
+        weights = weights.tocsr()
+
+        window = source_window(weights, shape)
+        self.assertEqual(window, (slice(2, 4), slice(1, 4)))
+
+        cropped = crop_weights(weights, shape, window)
+        self.assertEqual(cropped.shape, (2, 6))
+
+        data = np.arange(30.0).reshape(shape, order="F")
+        assert_allclose(
+            apply_weights(cropped, data[window], (2,)),
+            apply_weights(weights, data, (2,)),
+        )
+
+        self.assertIsNone(source_window(sparse.csr_matrix((2, 30)), shape))
+
+    def test_apply_weights_threads(self):
+        rng = np.random.default_rng(1)
+        weights = sparse.random(50, 100, density=0.1, format="csr", random_state=1)
+        data = rng.random(100)
+        expected = apply_weights(weights, data, (50,))
+
+        for threads in [1, 2, 3, 64]:
+            assert_allclose(
+                apply_weights(weights, data, (50,), threads=threads), expected
+            )
+
+        vertical = sparse.random(4, 3, density=0.8, format="csr", random_state=2)
+        data = rng.random((100, 3))
+        assert_allclose(
+            apply_weights(weights, data, (50, 4), vertical=vertical, threads=3),
+            apply_weights(weights, data, (50, 4), vertical=vertical),
+        )
+
+    def test_split_rows(self):
+        weights = sparse.random(50, 100, density=0.1, format="csr", random_state=1)
+        data = np.random.default_rng(1).random(100)
+
+        blocks = split_rows(weights, 3)
+        self.assertEqual(len(blocks), 3)
+        self.assertEqual(blocks[0][0], 0)
+        self.assertEqual(blocks[-1][1], 50)
+        self.assertTrue(np.shares_memory(blocks[1][2].data, weights.data))
+        assert_allclose(
+            sparse.vstack([block for _, _, block in blocks]).toarray(),
+            weights.toarray(),
+        )
+        assert_allclose(
+            apply_weights(weights, data, (50,), blocks=blocks),
+            apply_weights(weights, data, (50,)),
+        )
+        self.assertLessEqual(len(split_rows(weights[:2], 8)), 2)
+
+    def test_apply_weights_stack(self):
+        rng = np.random.default_rng(1)
+        weights = sparse.random(12, 30, density=0.3, format="csr", random_state=1)
+        unmapped = np.zeros(12, dtype=bool)
+        unmapped[2] = True
+
+        data = rng.random((7, 6, 5))
+        result = apply_weights_stack(
+            weights, data, (4, 3), unmapped, scale=2.0, offset=1.0
+        )
+        self.assertEqual(result.shape, (7, 4, 3))
+        for step, expected in zip(data, result):
+            assert_allclose(
+                apply_weights(weights, step, (4, 3), unmapped, scale=2.0, offset=1.0),
+                expected,
+            )
+
+        vertical = sparse.random(4, 3, density=0.8, format="csr", random_state=2)
+        data = rng.random((7, 6, 5, 3))
+        result = apply_weights_stack(weights, data, (4, 3, 4), vertical=vertical)
+        self.assertEqual(result.shape, (7, 4, 3, 4))
+        for step, expected in zip(data, result):
+            assert_allclose(
+                apply_weights(weights, step, (4, 3, 4), vertical=vertical), expected
+            )
+
+    @unittest.skipIf(da is None, "dask not installed")
+    def test_apply_weights_lazy(self):
+        rng = np.random.default_rng(1)
+        weights = sparse.random(12, 30, density=0.2, format="csr", random_state=1)
+        unmapped = np.zeros(12, dtype=bool)
+        unmapped[3] = True
+
+        data = rng.random((6, 5))
+        result = apply_weights_lazy(
+            weights, da.from_array(data, chunks=(2, 3)), (4, 3), unmapped, scale=2.0
+        )
+        self.assertIsInstance(result, da.Array)
+        assert_allclose(
+            result.compute(),
+            apply_weights(weights, data, (4, 3), unmapped, scale=2.0),
+        )
+
+        vertical = sparse.random(4, 3, density=0.8, format="csr", random_state=2)
+        data = rng.random((6, 5, 3))
+        result = apply_weights_lazy(
+            weights, da.from_array(data, chunks=(2, 3, 1)), (4, 3, 4), vertical=vertical
+        )
+        assert_allclose(
+            result.compute(),
+            apply_weights(weights, data, (4, 3, 4), vertical=vertical),
+        )
+
+    def test_regrid_weights(self):
+        rng = np.random.default_rng(1)
+        matrix = sparse.lil_matrix((12, 30))
+        matrix[:, 7:9] = rng.random((12, 2))
+        matrix[:, 13:15] = rng.random((12, 2))
+        unmapped = np.zeros(12, dtype=bool)
+        unmapped[3] = True
+        matrix[3, :] = 0.0
+        matrix = matrix.tocsr()
+        matrix.eliminate_zeros()
+
+        grids = (fm.UniformGrid((7, 6)), fm.UniformGrid((5, 4)))
+        weights = RegridWeights(matrix, (4, 3), unmapped, grids=grids)
+        data = rng.random((6, 5))
+        expected = apply_weights(matrix, data, (4, 3), unmapped, scale=2.0)
+
+        self.assertEqual(weights.crop((6, 5)), (2, 2))
+        self.assertEqual(weights.cropped.shape, (12, 4))
+        assert_allclose(weights.apply(data, scale=2.0), expected)
+
+        weights.split(2)
+        self.assertEqual(len(weights.blocks), 2)
+        self.assertEqual(weights.blocks[0][2].shape[1], 4)
+        assert_allclose(weights.apply(data, scale=2.0), expected)
+
+        if da is not None:
+            lazy = weights.apply_lazy(da.from_array(data, chunks=(3, 2)), scale=2.0)
+            assert_allclose(lazy.compute(), expected)
+        assert_allclose(
+            weights.apply_stack(np.stack([data, data]), scale=2.0),
+            np.stack([expected, expected]),
+        )
+
+        weights.prepare_diagnostics(np.ones(30), np.ones(12))
+        conservation = weights.diagnose(None, data)
+        self.assertAlmostEqual(conservation["source"], np.sum(data))
+        self.assertAlmostEqual(conservation["target"], np.sum(matrix @ data.ravel("F")))
+
+        restored = RegridWeights.from_state(weights.to_state())
+        self.assertIsNone(restored.grids)
+        self.assertEqual(restored.fingerprints[1], weights.to_state()["out_grid"])
+        self.assertEqual(restored.shape, (4, 3))
+        assert_allclose(restored.matrix.toarray(), matrix.toarray())
+        assert_allclose(restored.unmapped, unmapped)
+        assert_allclose(restored.integrals, weights.integrals)
+
+
+if __name__ == "__main__":
+    unittest.main()